@@ -0,0 +1,147 @@
+import argparse
+import csv
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from time import perf_counter
+from typing import Dict, List, Set, Tuple
+
+from utils import *
+from grasp import construct
+from local_search import local_search
+from shared import SharedInstance, SharedInstanceHandle, attach_instance
+
+# Column layout read by graphics.py, plus the settings of the run
+FIELDS = ["instance", "constructor", "strategy", "value", "best_time", "seed", "alpha", "time_limit"]
+
+CONSTRUCTOR_NAMES = {"0": "Savings", "1": "Insertion", "2": "Sweep", "3": "Split"}
+
+RunKey = Tuple[str, str, str, str, str, str]
+
+
+def strategy_name(periodic_break: int, tau_reduction: int) -> str:
+    """
+    Strategy labels used in results_alt.csv: D = periodic break
+    (diversification), I = tau reduction (intensification).
+    """
+    if periodic_break and tau_reduction:
+        return "D+I"
+    if periodic_break:
+        return "D"
+    if tau_reduction:
+        return "I"
+    return "-"
+
+
+def run_key(inst: int, construction: str, periodic_break: int, tau_reduction: int, seed: int,
+            alpha: float, time_limit: float) -> RunKey:
+    return (str(inst + 1), CONSTRUCTOR_NAMES.get(construction, construction),
+            strategy_name(periodic_break, tau_reduction), str(seed), str(float(alpha)), str(float(time_limit)))
+
+
+def completed_runs(output: str) -> Set[RunKey]:
+    """
+    Keys of the runs already present in the output CSV. Raises ValueError if
+    the CSV lacks some of the FIELDS (written by an older batch.py), since its
+    runs cannot be told apart by their settings.
+    """
+    if not os.path.exists(output) or os.path.getsize(output) == 0:
+        return set()
+    with open(output, newline='') as file:
+        reader = csv.DictReader(file, delimiter=';')
+        missing = [field for field in FIELDS if field not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{output} has no {', '.join(missing)} column(s); write to a new --output.")
+        return {(row["instance"], row["constructor"], row["strategy"], row["seed"],
+                 str(float(row["alpha"])), str(float(row["time_limit"])))
+                for row in reader}
+
+
+def run_experiment(handle: SharedInstanceHandle, inst: int, construction: str, periodic_break: int,
+                   tau_reduction: int, seed: int, alpha: float, time_limit: float) -> Dict[str, object]:
+    """
+    One construction + local search run, as main.py does, returning its CSV row.
+    """
+    start_time = perf_counter()
+    instance = attach_instance(handle)
+    solution = construct(instance, construction, alpha, random.Random(seed))
+    _, cost, time_best, _ = local_search(solution, instance, start_time, time_limit,
+                                         periodic_break, tau_reduction, verbose=False)
+    key = run_key(inst, construction, periodic_break, tau_reduction, seed, alpha, time_limit)
+    return {"instance": key[0], "constructor": key[1], "strategy": key[2],
+            "value": cost, "best_time": round(time_best, 2), "seed": seed, "alpha": key[4], "time_limit": key[5]}
+
+
+def run_batch(instance_ids: List[int], constructions: List[str], periodic_breaks: List[int],
+              tau_reductions: List[int], seeds: List[int], output: str, jobs: int,
+              time_limit: float = 60 * 30, alpha: float = 0.0) -> int:
+    """
+    Runs the grid instances x constructions x periodic_break x tau_reduction
+    x seeds on at most `jobs` processes. Runs already in `output` with the same
+    `alpha` and `time_limit` are skipped, so an interrupted batch is resumed by
+    running it again. Rows are appended to `output` as runs finish. Returns the
+    number of runs done.
+
+    With `alpha` = 0 the constructions are deterministic, so every seed would
+    repeat the same run: only the first one is used.
+    """
+    if alpha == 0:
+        seeds = seeds[:1]
+    done = completed_runs(output)
+    grid = [(inst, construction, pb, tr, seed)
+            for inst in instance_ids for construction in constructions
+            for pb in periodic_breaks for tr in tau_reductions for seed in seeds
+            if run_key(inst, construction, pb, tr, seed, alpha, time_limit) not in done]
+    if not grid:
+        return 0
+
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    new_file = not os.path.exists(output) or os.path.getsize(output) == 0
+    with ExitStack() as stack:
+        # Each instance is read once and shared with the workers
+        shared = {inst: stack.enter_context(SharedInstance(read_instance(instances_path + instances[inst])))
+                  for inst in sorted({run[0] for run in grid})}
+        file = stack.enter_context(open(output, 'a', newline=''))
+        writer = csv.DictWriter(file, fieldnames=FIELDS, delimiter=';')
+        if new_file:
+            writer.writeheader()
+            file.flush()
+
+        pool = stack.enter_context(ProcessPoolExecutor(max_workers=jobs))
+        futures = [pool.submit(run_experiment, shared[inst].handle, inst, construction, pb, tr,
+                               seed, alpha, time_limit)
+                   for inst, construction, pb, tr, seed in grid]
+        for future in as_completed(futures):
+            row = future.result()
+            writer.writerow(row)
+            file.flush()
+            print(";".join(str(row[field]) for field in FIELDS))
+
+    return len(grid)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs a grid of main.py-style experiments in parallel.")
+    parser.add_argument("--instances", type=int, nargs="+", default=list(range(len(instances))),
+                        help="instance indices, as in main.py (default: all)")
+    parser.add_argument("--constructions", nargs="+", default=["0", "1", "2"],
+                        help="construction ids, as in main.py (default: 0 1 2)")
+    parser.add_argument("--periodic-break", type=int, nargs="+", default=[0, 1])
+    parser.add_argument("--tau-reduction", type=int, nargs="+", default=[0, 1])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0],
+                        help="seeds of the randomized constructions (default: 0); only the first one is "
+                             "used with --alpha 0, where every seed gives the same run")
+    parser.add_argument("--alpha", type=float, default=0.0,
+                        help="RCL alpha of the constructions (0 = deterministic)")
+    parser.add_argument("--time-limit", type=float, default=60 * 30,
+                        help="seconds per run (default: 1800)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="maximum number of concurrent runs (default: number of CPUs)")
+    parser.add_argument("--output", default="results/batch.csv")
+    args = parser.parse_args()
+
+    count = run_batch(args.instances, args.constructions, args.periodic_break, args.tau_reduction,
+                      args.seeds, args.output, args.jobs, args.time_limit, args.alpha)
+    print(f"{count} runs done")
@@ -0,0 +1,181 @@
+# Array versions of the local search neighborhoods (local_search(evaluation="batch")).
+#
+# Each function builds the delta matrix of a route or route pair from the
+# distance matrix, applies the capacity, tabu and granular filters as masks and
+# takes the argmin of the masked result. They return the same (best, best_free)
+# pairs as the scalar neighborhoods, ties included (first move in loop order).
+#
+# W is the distance matrix widened to int64/float64 so the sums match the
+# scalar ones exactly; `demands` and `tabu` are indexed by node and
+# `candidates` holds the granular candidate lists, row u listing the
+# candidate neighbors of node u padded with -1 (or None). `asleep` holds the
+# don't-look bits of the nodes during a don't-look scan (or None): moves whose
+# customers and the ones they are inserted next to all sleep are masked.
+from typing import Optional, Tuple
+
+import numpy as np
+
+from solution import SolutionState
+
+Move = Tuple[float, int, int]
+NO_MOVE: Move = (float('inf'), -1, -1)
+
+
+def _argmin(delta: np.ndarray, allowed: np.ndarray, i_offset: int, j_offset: int) -> Move:
+    if not allowed.any():
+        return NO_MOVE
+    masked = np.where(allowed, delta, np.inf if delta.dtype.kind == 'f' else np.iinfo(delta.dtype).max)
+    flat = int(np.argmin(masked))
+    i, j = divmod(flat, delta.shape[1])
+    return delta[i, j].item(), i + i_offset, j + j_offset
+
+
+def _best_pair(delta: np.ndarray, feasible: np.ndarray, tabu: np.ndarray,
+               i_offset: int, j_offset: int) -> Tuple[Move, Move]:
+    best = _argmin(delta, feasible, i_offset, j_offset)
+    best_free = _argmin(delta, feasible & ~tabu, i_offset, j_offset)
+    return best, best_free
+
+
+def _is_candidate(candidates: np.ndarray, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """
+    Whether (u, v) is a candidate arc, elementwise over the broadcast of u and v.
+    """
+    return (candidates[u] == v[..., None]).any(axis=-1)
+
+
+def _removal(W: np.ndarray, prev: np.ndarray, rem: np.ndarray, next: np.ndarray) -> np.ndarray:
+    return - W[prev, rem] - W[rem, next] + W[prev, next]
+
+
+def _insertion(W: np.ndarray, prev: np.ndarray, ins: np.ndarray, next: np.ndarray) -> np.ndarray:
+    return - W[prev, next] + W[prev, ins] + W[ins, next]
+
+
+def reinsertion(W: np.ndarray, demands: np.ndarray, capacity: int, state: SolutionState,
+                r_1: int, r_2: int, tabu: np.ndarray,
+                candidates: Optional[np.ndarray] = None, asleep: Optional[np.ndarray] = None) -> Tuple[Move, Move]:
+    route_1 = np.asarray(state.routes[r_1])
+    route_2 = np.asarray(state.routes[r_2])
+    if len(route_1) < 2 or len(route_2) < 2:
+        return NO_MOVE, NO_MOVE
+
+    v = route_1[1:, None]                          # removed node, by r_pos
+    prev_1 = route_1[:-1, None]
+    next_1 = np.roll(route_1, -1)[1:, None]
+    prev_2 = route_2[None, :-1]                    # insertion gap, by i_pos
+    next_2 = route_2[None, 1:]
+
+    delta = _removal(W, prev_1, v, next_1) + _insertion(W, prev_2, v, next_2)
+
+    feasible = np.broadcast_to(demands[v] <= capacity - state.load[r_2], delta.shape)
+    if candidates is not None:
+        feasible = feasible & (_is_candidate(candidates, v, prev_2) | _is_candidate(candidates, v, next_2))
+    if asleep is not None:
+        feasible = feasible & ~(asleep[v] & asleep[prev_2] & asleep[next_2])
+    is_tabu = tabu[v] | tabu[next_2]
+    return _best_pair(delta, feasible, is_tabu, 1, 1)
+
+
+def two_opt(W: np.ndarray, state: SolutionState, r: int, tabu: np.ndarray,
+            asleep: Optional[np.ndarray] = None) -> Tuple[Move, Move]:
+    route = np.asarray(state.routes[r])
+    l_r = len(route)
+    if l_r < 3:
+        return NO_MOVE, NO_MOVE
+
+    idx = np.arange(1, l_r)
+    i = idx[:-1, None]                             # i in 1 .. l_r-2
+    j = idx[None, :]                               # j in 1 .. l_r-1
+    a = route[i]
+    prev = route[i - 1]
+    b = route[j]
+    next = route[(j + 1) % l_r]
+
+    delta = - W[prev, a] - W[b, next] + W[prev, b] + W[a, next]
+
+    feasible = (j > i) & ~((i == 1) & (j == l_r - 1))
+    if asleep is not None:
+        feasible = feasible & ~(asleep[prev] & asleep[a] & asleep[b] & asleep[next])
+    is_tabu = tabu[a] | tabu[b]
+    return _best_pair(delta, feasible, is_tabu, 1, 1)
+
+
+def intra_swap(W: np.ndarray, state: SolutionState, r: int, tabu: np.ndarray,
+               asleep: Optional[np.ndarray] = None) -> Tuple[Move, Move]:
+    route = np.asarray(state.routes[r])
+    l_r = len(route)
+    if l_r < 4:
+        return NO_MOVE, NO_MOVE
+
+    idx = np.arange(1, l_r)
+    i = idx[:-1, None]
+    j = idx[None, :]
+    a = route[i]
+    prev_i = route[i - 1]
+    next_i = route[(i + 1) % l_r]
+    b = route[j]
+    prev_j = route[j - 1]
+    next_j = route[(j + 1) % l_r]
+
+    delta = (
+        _removal(W, prev_i, a, next_i)
+        + _insertion(W, prev_j, a, next_j)
+        + _removal(W, prev_j, b, next_j)
+        + _insertion(W, prev_i, b, next_i)
+    )
+
+    feasible = j >= i + 2
+    if asleep is not None:
+        feasible = feasible & ~(asleep[prev_i] & asleep[a] & asleep[next_i]
+                                & asleep[prev_j] & asleep[b] & asleep[next_j])
+    is_tabu = tabu[a] | tabu[b]
+    return _best_pair(delta, feasible, is_tabu, 1, 1)
+
+
+def inter_swap(W: np.ndarray, demands: np.ndarray, capacity: int, state: SolutionState,
+               r_1: int, r_2: int, tabu: np.ndarray,
+               candidates: Optional[np.ndarray] = None, asleep: Optional[np.ndarray] = None) -> Tuple[Move, Move]:
+    route_1 = np.asarray(state.routes[r_1])
+    route_2 = np.asarray(state.routes[r_2])
+    if len(route_1) < 2 or len(route_2) < 2:
+        return NO_MOVE, NO_MOVE
+
+    v_1 = route_1[1:, None]
+    prev_1 = route_1[:-1, None]
+    next_1 = np.roll(route_1, -1)[1:, None]
+    v_2 = route_2[None, 1:]
+    prev_2 = route_2[None, :-1]
+    next_2 = np.roll(route_2, -1)[None, 1:]
+
+    delta = (
+        _removal(W, prev_1, v_1, next_1)
+        + _insertion(W, prev_2, v_1, next_2)
+        + _removal(W, prev_2, v_2, next_2)
+        + _insertion(W, prev_1, v_2, next_1)
+    )
+
+    feasible = ((demands[v_1] <= capacity - state.load[r_2] + demands[v_2])
+                & (demands[v_2] <= capacity - state.load[r_1] + demands[v_1]))
+    if candidates is not None:
+        feasible &= (_is_candidate(candidates, v_1, prev_2) | _is_candidate(candidates, v_1, next_2)
+                     | _is_candidate(candidates, prev_1, v_2) | _is_candidate(candidates, next_1, v_2))
+    if asleep is not None:
+        feasible &= ~(asleep[prev_1] & asleep[v_1] & asleep[next_1] & asleep[prev_2] & asleep[v_2] & asleep[next_2])
+    is_tabu = tabu[v_1] | tabu[v_2]
+    return _best_pair(delta, feasible, is_tabu, 1, 1)
+
+
+def break_route(W: np.ndarray, state: SolutionState, r: int,
+                asleep: Optional[np.ndarray] = None) -> Tuple[Move, Move]:
+    route = np.asarray(state.routes[r])
+    if len(route) < 3:
+        return NO_MOVE, NO_MOVE
+
+    prev = route[None, 1:-1]
+    next = route[None, 2:]
+    delta = _insertion(W, prev, 0, next)
+
+    allowed = np.ones(delta.shape, dtype=bool) if asleep is None else ~(asleep[prev] & asleep[next])
+    best = _argmin(delta, allowed, 0, 2)
+    return (best[0], best[2], best[2]), (best[0], best[2], best[2])
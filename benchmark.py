@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tracemalloc
+from statistics import median
+from time import perf_counter
+from typing import Callable, Dict, List, Tuple
+
+from utils import *
+from construction import *
+from distances import compute_distance_matrix
+from instrumentation import SearchStats
+from local_search import local_search
+
+# Benchmarks run on every instance. Each entry is (metric, kind), where kind
+# tells how a change is judged: "time" and "memory" regress when they grow,
+# "rate" when it drops.
+METRICS = [
+    ("read_instance_s", "time"),
+    ("distance_matrix_s", "time"),
+    ("savings_s", "time"),
+    ("insertion_s", "time"),
+    ("sweep_s", "time"),
+    ("split_s", "time"),
+    ("ls_iterations_per_s", "rate"),
+    ("ls_moves_per_s", "rate"),
+    ("peak_memory_mb", "memory"),
+]
+
+# Time increases ignored by default, in seconds: above the run-to-run jitter
+# of the medians of the constructions, up to about 0.07 s on the largest
+# instances
+MIN_TIME = 0.1
+
+CONSTRUCTIONS: Dict[str, Callable[[CVRPInstance], List[List[int]]]] = {
+    "savings": savings_constructive_heuristic,
+    "insertion": lambda instance: insertion_constructive_heuristic(instance, lam=1),
+    "sweep": sweep_constructive_heuristic,
+    "split": split_constructive_heuristic,
+}
+
+
+def elapsed(function: Callable) -> float:
+    """
+    Wall time of one call.
+    """
+    start = perf_counter()
+    function()
+    return perf_counter() - start
+
+
+def ls_budget(filename: str, ls_time: float) -> int:
+    """
+    Iterations the local search does in `ls_time` seconds from the savings
+    solution.
+    """
+    instance = read_instance(filename)
+    stats = SearchStats()
+    local_search(savings_constructive_heuristic(instance), instance, perf_counter(), ls_time, 0, 0,
+                 verbose=False, stats=stats)
+    return stats.iterations
+
+
+def sample_instance(filename: str, ls_iterations: int) -> Dict[str, float]:
+    """
+    One measurement of every metric of an instance except peak memory. The
+    local search runs exactly `ls_iterations` iterations from the savings
+    solution; `ls_cost` is the best cost it reaches, which only changes when
+    the search itself changes.
+    """
+    result: Dict[str, float] = {}
+    result["read_instance_s"] = elapsed(lambda: read_instance(filename))
+    instance = read_instance(filename)
+    result["distance_matrix_s"] = elapsed(lambda: compute_distance_matrix(instance.coords, instance.rounding))
+    for name, construct in CONSTRUCTIONS.items():
+        result[f"{name}_s"] = elapsed(lambda: construct(instance))
+
+    stats = SearchStats()
+    _, result["ls_cost"], _, _ = local_search(savings_constructive_heuristic(instance), instance, perf_counter(),
+                                              float('inf'), 0, 0, verbose=False, stats=stats,
+                                              max_iterations=ls_iterations)
+    result["ls_iterations_per_s"] = stats.iterations_per_second
+    result["ls_moves_per_s"] = stats.moves_per_second
+    return result
+
+
+def peak_memory(filename: str) -> float:
+    """
+    Peak traced memory (MiB) of reading the instance, every construction and
+    10 local search iterations. Measured apart, so the tracemalloc overhead
+    does not affect the timings.
+    """
+    tracemalloc.start()
+    instance = read_instance(filename)
+    for construct in CONSTRUCTIONS.values():
+        construct(instance)
+    local_search(savings_constructive_heuristic(instance), instance, perf_counter(), float('inf'), 0, 0,
+                 verbose=False, max_iterations=10)
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return peak
+
+
+def benchmark(filenames: Dict[str, str], ls_time: float, repeat: int,
+              ls_iterations: Dict[str, int]) -> Dict[str, Dict[str, float]]:
+    """
+    Measures the instances `filenames` (name -> path). Every metric is the
+    median of `repeat` samples, taken in turns (every instance once, then
+    again), so that a slow period of the machine disturbs one sample of
+    several instances instead of all the samples of one.
+
+    The local search runs `ls_iterations[name]` iterations, or as many as it
+    does in `ls_time` seconds for the instances missing there: comparisons
+    reuse the baseline's counts, so that both measure the same work (the
+    iteration rate changes along the search).
+    """
+    budgets = {name: ls_iterations.get(name) or ls_budget(path, ls_time) for name, path in filenames.items()}
+    samples: Dict[str, List[Dict[str, float]]] = {name: [] for name in filenames}
+    for _ in range(repeat):
+        for name, path in filenames.items():
+            samples[name].append(sample_instance(path, budgets[name]))
+
+    results = {}
+    for name, path in filenames.items():
+        result = {metric: median(sample[metric] for sample in samples[name]) for metric in samples[name][0]}
+        result["ls_iterations"] = budgets[name]
+        result["ls_cost"] = samples[name][-1]["ls_cost"]
+        result["peak_memory_mb"] = peak_memory(path)
+        results[name] = result
+    return results
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float,
+            min_time: float = MIN_TIME) -> Tuple[List[str], List[str]]:
+    """
+    Compares two benchmark results. Returns (regressions, notes): a metric
+    regresses when it is worse than the baseline by more than `tolerance`
+    (relative) and, for times, by more than `min_time` seconds, so the
+    jitter of short steps is not reported. Notes report local
+    search costs that differ from the baseline, i.e. searches that no longer
+    follow the same trajectory.
+    """
+    regressions = []
+    notes = []
+    for name, metrics in current["instances"].items():
+        reference = baseline["instances"].get(name)
+        if reference is None:
+            continue
+        for metric, kind in METRICS:
+            if metric not in reference or metric not in metrics:
+                continue
+            old = reference[metric]
+            new = metrics[metric]
+            if kind == "rate":
+                worse = new < old / (1 + tolerance)
+            elif kind == "time":
+                worse = new > old * (1 + tolerance) and new - old > min_time
+            else:
+                worse = new > old * (1 + tolerance)
+            if worse:
+                regressions.append(f"{name} {metric}: {old:.4g} -> {new:.4g}")
+        if reference.get("ls_cost") != metrics.get("ls_cost"):
+            notes.append(f"{name} ls_cost: {reference.get('ls_cost')} -> {metrics.get('ls_cost')}")
+    return regressions, notes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks instance reading, the constructions and the local search.")
+    parser.add_argument("--instances", type=int, nargs="+", default=list(range(len(instances))),
+                        help="instance indices, as in main.py (default: all)")
+    parser.add_argument("--ls-time", type=float, default=2.0,
+                        help="approximate seconds of each local search run, which sets its iteration count "
+                             "unless the baseline has one (default: 2)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="samples per metric, the median is kept (default: 5)")
+    parser.add_argument("--output", default="results/benchmark.json")
+    parser.add_argument("--baseline", default="benchmark_baseline.json")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="relative slowdown reported as a regression (default: 0.25)")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME,
+                        help=f"time increases below this many seconds are ignored (default: {MIN_TIME})")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="write the results to the baseline file instead of comparing")
+    args = parser.parse_args()
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    # The same local search work as the baseline, for the instances it has
+    ls_iterations = {}
+    if baseline is not None:
+        ls_iterations = {name: metrics["ls_iterations"] for name, metrics in baseline["instances"].items()
+                         if "ls_iterations" in metrics}
+    current = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "instances": benchmark({instances[inst]: instances_path + instances[inst] for inst in args.instances},
+                               args.ls_time, args.repeat, ls_iterations),
+    }
+    for name, metrics in current["instances"].items():
+        print(name, json.dumps({k: round(v, 4) for k, v in metrics.items()}))
+
+    target = args.baseline if args.save_baseline else args.output
+    if os.path.dirname(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'w') as file:
+        json.dump(current, file, indent=2)
+
+    if baseline is None:
+        sys.exit(0)
+
+    regressions, notes = compare(current, baseline, args.tolerance, args.min_time)
+    for note in notes:
+        print(f"note: {note}")
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    print(f"{len(regressions)} regressions (tolerance {args.tolerance:.0%})")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,32 @@
+import json
+import os
+from typing import Any, Dict
+
+# Checkpoints are small JSON documents (routes, tabu list and counters), so
+# they can be inspected by hand. Bump CHECKPOINT_VERSION when fields change.
+CHECKPOINT_VERSION = 2
+
+
+def save_checkpoint(path: str, data: Dict[str, Any]):
+    """
+    Writes a checkpoint atomically: the data goes to a temporary file that
+    replaces `path` only once it is complete, so a job killed while writing
+    never leaves a truncated checkpoint behind.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as file:
+        json.dump(dict(data, version=CHECKPOINT_VERSION), file, separators=(',', ':'))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path: str) -> Dict[str, Any]:
+    with open(path) as file:
+        data = json.load(file)
+    if data.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{path}: unsupported checkpoint version {data.get('version')}, "
+                         f"expected {CHECKPOINT_VERSION}.")
+    return data
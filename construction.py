@@ -1,52 +1,91 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
+import heapq
 import math
+import random
+from collections import deque
+
+import numpy as np
 
 from utils import *
 
 
-def savings_constructive_heuristic(cvrp_instance: CVRPInstance) -> List[List[int]]:
+def savings_constructive_heuristic(cvrp_instance: CVRPInstance, rcl_alpha: float = 0.0,
+                                   rng: Optional[random.Random] = None,
+                                   neighbors: Optional[int] = None) -> List[List[int]]:
+    """
+    Clarke & Wright (1964) parallel savings heuristic.
+
+    Savings s_ij = c_0i + c_0j - c_ij >= 0 are computed for all customer pairs
+    or, with `neighbors` = k, only for pairs where one customer is among the k
+    nearest nodes of the other, which keeps memory at O(n k) on large
+    instances. With k >= n - 1 the routes are the same as with all pairs.
+
+    With rcl_alpha > 0 and an rng (GRASP), each merge is drawn at random from
+    the restricted candidate list of mergeable savings s with
+        s >= s_best - rcl_alpha * (s_best - s_min),
+    s_best being the best mergeable saving and s_min the smallest saving.
+    """
     
     # Maps each node to its current route
     # Each route is represented as (route load, [0, ..., last customer])
     node_to_route: List[Tuple[int, List[int]]] = [(cvrp_instance.demands[i],[0,i]) for i in range(1, cvrp_instance.nnodes)] # List of routes
     
-    # Stores pairs of nodes whose connection (when possible) is worth it
-    savings: Dict[Tuple[int, int], float] = {} 
-    
-    nnodes = cvrp_instance.nnodes
-    for i in range(1, nnodes - 1):
-        for j in range(i + 1, nnodes):
-            c_0i = cvrp_instance.distance_matrix[0][i]
-            c_0j = cvrp_instance.distance_matrix[0][j]
-            c_ij = cvrp_instance.distance_matrix[i][j]
-            saving = c_0i + c_0j - c_ij
-        
-            if (saving >= 0): #in case saving == 0, you might at least reduce number of vehicles by 1
-                savings[(i, j)] = saving
-    
-    # Sort in decreasing order with respect to saving
-    sorted_savings = sorted(savings.items(), key=lambda item: item[1], reverse=True)
+    # Pairs of nodes whose connection (when possible) is worth it, in
+    # decreasing order of saving (ties by pair)
+    sorted_savings = _sorted_savings(cvrp_instance, neighbors)
     
     not_endpoints = set() # node is here => not an endpoint of its route anymore
-    
-    for candidate in sorted_savings:
+
+    def mergeable(candidate) -> bool:
         v1_idx = candidate[0][0] - 1
         v2_idx = candidate[0][1] - 1
         if (v1_idx in not_endpoints) or (v2_idx in not_endpoints):
-            continue
+            return False
         route1 = node_to_route[v1_idx]; route2 = node_to_route[v2_idx]
         if route1 is route2:
-            continue
-        if route1[0] + route2[0] <= cvrp_instance.capacity: 
-            new_route = _merge_routes(route1, route2, v1_idx, v2_idx)
-            if (len(route1[1]) > 2):
-                not_endpoints.add(v1_idx)
-            if (len(route2[1]) > 2):
-                not_endpoints.add(v2_idx)
-            for node in new_route[1][1:]:
-                node_to_route[node - 1] = new_route
-           
-            
+            return False
+        return route1[0] + route2[0] <= cvrp_instance.capacity
+
+    def merge(candidate):
+        v1_idx = candidate[0][0] - 1
+        v2_idx = candidate[0][1] - 1
+        route1 = node_to_route[v1_idx]; route2 = node_to_route[v2_idx]
+        new_route = _merge_routes(route1, route2, v1_idx, v2_idx)
+        if (len(route1[1]) > 2):
+            not_endpoints.add(v1_idx)
+        if (len(route2[1]) > 2):
+            not_endpoints.add(v2_idx)
+        for node in new_route[1][1:]:
+            node_to_route[node - 1] = new_route
+
+    if rng is None or rcl_alpha <= 0:
+        for candidate in sorted_savings:
+            if mergeable(candidate):
+                merge(candidate)
+    else:
+        # A saving that is not mergeable never becomes mergeable again (routes
+        # only grow), so scanned candidates outside the RCL are dropped.
+        pending = list(sorted_savings)
+        s_min = pending[-1][1] if pending else 0
+        while True:
+            rcl = []
+            threshold = None
+            k = 0
+            while k < len(pending):
+                candidate = pending[k]
+                if threshold is not None and candidate[1] < threshold:
+                    break
+                if mergeable(candidate):
+                    if threshold is None:
+                        threshold = candidate[1] - rcl_alpha * (candidate[1] - s_min)
+                    rcl.append(candidate)
+                k += 1
+            if not rcl:
+                break
+            chosen = rng.randrange(len(rcl))
+            merge(rcl.pop(chosen))
+            pending[:k] = rcl
+
     # Constructs final solution:
     seen = set()
     final_solution = []
@@ -59,6 +98,56 @@ def savings_constructive_heuristic(cvrp_instance: CVRPInstance) -> List[List[int
     return final_solution
             
     
+# Number of rows of savings computed per block, and of sorted savings
+# converted to Python objects at a time
+SAVINGS_BLOCK = 1024
+
+
+def _sorted_savings(cvrp_instance: CVRPInstance, neighbors: Optional[int] = None):
+    """
+    Yields ((i, j), s_ij) for the customer pairs i < j with s_ij >= 0, in
+    decreasing order of saving and, for equal savings, increasing (i, j).
+
+    Savings are computed in blocks of rows as arrays and ordered with a single
+    lexsort over the compact arrays; only the pair being consumed is turned
+    into Python objects.
+    """
+    n = cvrp_instance.nnodes
+    dm = cvrp_instance.distance_matrix
+    wide = np.float64 if dm.dtype.kind == 'f' else np.int64
+    c_0 = dm[0].astype(wide)
+
+    if neighbors is None or neighbors >= n - 1:
+        firsts, seconds, values = [], [], []
+        for start in range(1, n - 1, SAVINGS_BLOCK):
+            stop = min(start + SAVINGS_BLOCK, n - 1)
+            block = c_0[start:stop, None] + c_0[None, :] - dm[start:stop].astype(wide)
+            rows, cols = np.nonzero((np.arange(n)[None, :] > np.arange(start, stop)[:, None]) & (block >= 0))
+            firsts.append((rows + start).astype(np.int32))
+            seconds.append(cols.astype(np.int32))
+            values.append(block[rows, cols])
+        first = np.concatenate(firsts) if firsts else np.empty(0, dtype=np.int32)
+        second = np.concatenate(seconds) if seconds else np.empty(0, dtype=np.int32)
+        saving = np.concatenate(values) if values else np.empty(0, dtype=wide)
+    else:
+        near = cvrp_instance.nearest_neighbors(neighbors)
+        first = np.repeat(np.arange(n, dtype=np.int64), near.shape[1])
+        second = near.ravel().astype(np.int64)
+        keep = (first > 0) & (second > 0)
+        pairs = np.unique(np.minimum(first, second)[keep] * n + np.maximum(first, second)[keep])
+        first = (pairs // n).astype(np.int32)
+        second = (pairs % n).astype(np.int32)
+        saving = c_0[first] + c_0[second] - dm[first, second].astype(wide)
+        keep = saving >= 0
+        first, second, saving = first[keep], second[keep], saving[keep]
+
+    order = np.lexsort((second, first, -saving))
+    for start in range(0, len(order), SAVINGS_BLOCK):
+        chunk = order[start:start + SAVINGS_BLOCK]
+        for i, j, s_ij in zip(first[chunk].tolist(), second[chunk].tolist(), saving[chunk].tolist()):
+            yield (i, j), s_ij
+
+
 def _merge_routes(route1: Tuple[int, List[int]], route2: Tuple[int, List[int]],
                  v1_idx: int, v2_idx: int) -> List[int]:
     
@@ -75,7 +164,8 @@ def _merge_routes(route1: Tuple[int, List[int]], route2: Tuple[int, List[int]],
     return new_route
         
     
-def insertion_constructive_heuristic(instance: CVRPInstance, lam: float = 1.0):
+def insertion_constructive_heuristic(instance: CVRPInstance, lam: float = 1.0, rcl_alpha: float = 0.0,
+                                     rng: Optional[random.Random] = None):
     """
     Implement the Mole & Jameson (1976) sequential insertion constructive heuristic.
     No local search step is included.
@@ -97,13 +187,19 @@ def insertion_constructive_heuristic(instance: CVRPInstance, lam: float = 1.0):
         The insertion criterion is:
             α(i, k, j) = dist[i][k] + dist[k][j] - lam * dist[i][j]
         and the customer/position with the lowest α is selected.
+    rcl_alpha : float
+        GRASP greediness. With rcl_alpha > 0 and an rng, the seed is drawn from
+        the customers with demand >= d_max - rcl_alpha * (d_max - d_min), and
+        each insertion from the (customer, position) pairs with
+        α <= α_min + rcl_alpha * (α_max - α_min).
+    rng : random.Random, optional
+        Random source for the randomized version.
     """
+    randomized = rng is not None and rcl_alpha > 0
 
     n = instance.nnodes
     depot = instance.depot
-    capacity = instance.capacity
     demands = instance.demands
-    dist = instance.distance_matrix
 
     unrouted = set(range(1, n))  # all customer nodes (excluding depot)
     routes = []
@@ -113,7 +209,13 @@ def insertion_constructive_heuristic(instance: CVRPInstance, lam: float = 1.0):
 
         # ---- Select initial seed customer (choose farthest or simply first) ----
         # Here: pick the customer with largest demand first (better stability)
-        seed = max(unrouted, key=lambda x: demands[x])
+        if not randomized:
+            seed = max(unrouted, key=lambda x: demands[x])
+        else:
+            d_max = max(demands[u] for u in unrouted)
+            d_min = min(demands[u] for u in unrouted)
+            threshold = d_max - rcl_alpha * (d_max - d_min)
+            seed = rng.choice(sorted(u for u in unrouted if demands[u] >= threshold))
         
         # Initialize new route
         route = [depot, seed]
@@ -121,72 +223,159 @@ def insertion_constructive_heuristic(instance: CVRPInstance, lam: float = 1.0):
         unrouted.remove(seed)
 
         # ---- Sequential insertion phase ----
-        while True:
-            best_customer = None
-            best_pos = None
-            best_alpha = float('inf')
+        if randomized:
+            while True:
+                best_customer, best_pos = _random_insertion(route, load, unrouted, instance, lam, rcl_alpha, rng)
+                if best_customer is None:
+                    break  # Cannot insert more customers in this route
 
-            # Try all unrouted customers
-            for u in unrouted:
-                if load + demands[u] > capacity:
-                    continue  # cannot add this customer
+                # Insert selected customer
+                route.insert(best_pos, best_customer)
+                load += demands[best_customer]
+                unrouted.remove(best_customer)
+        else:
+            _cheapest_insertions(route, load, unrouted, instance, lam)
 
-                # Try all insertion positions (i, j) in the route
-                for pos in range(len(route) - 1):
-                    i = route[pos]
-                    j = route[pos + 1]
+        # Add constructed route
+        routes.append(route)
 
-                    alpha = dist[i][u] + dist[u][j] - lam * dist[i][j]
+    return routes
+        
 
-                    if alpha < best_alpha:
-                        best_alpha = alpha
-                        best_customer = u
-                        best_pos = pos + 1
+def _cheapest_insertions(route: List[int], load: int, unrouted: set, instance: CVRPInstance, lam: float):
+    """
+    Insertion phase of the deterministic Mole & Jameson heuristic: inserts the
+    (customer, position) pair with the lowest α into `route` (in place) until
+    no unrouted customer fits, removing the inserted ones from `unrouted`.
 
-            if best_customer is None:
-                break  # Cannot insert more customers in this route
+    Instead of rescanning every customer against every position after each
+    insertion, the best insertion arc and α of each customer are cached in
+    arrays, and a heap keyed by (α, customer) gives the next one to insert.
+    Inserting k between i and j only removes the arc (i, j) and creates (i, k)
+    and (k, j), so each cached entry is just compared with the two new arcs,
+    unless its arc was (i, j), in which case it is recomputed. Customers that
+    no longer fit are dropped.
 
-            # Insert best customer
-            route.insert(best_pos, best_customer)
-            load += demands[best_customer]
-            unrouted.remove(best_customer)
+    Ties are resolved as in the full scan (lowest customer index, then first
+    position), so the routes are the same.
+    """
+    dm = instance.distance_matrix
+    wide = np.float64 if dm.dtype.kind == 'f' else np.int64
+    demands = np.asarray(instance.demands)
 
-        # Add constructed route
-        routes.append(route)
+    def d(a, b):
+        return dm[a, b].astype(wide)
 
-    return routes
-        
+    # Candidate customers, in increasing index order
+    cand = np.array(sorted(u for u in unrouted if load + demands[u] <= instance.capacity), dtype=np.int64)
+    alive = np.ones(len(cand), dtype=bool)
+
+    # Route position of each routed node; the closing arc back to the depot
+    # is not an insertion position
+    position = np.zeros(instance.nnodes, dtype=np.int64)
+    position[route] = np.arange(len(route))
+    next = {route[pos]: route[pos + 1] for pos in range(len(route) - 1)}
+
+    def scan(idx):
+        # Best arc (first in route order among ties) of the candidates cand[idx]
+        nodes = np.asarray(route)
+        heads = nodes[:-1, None]
+        tails = nodes[1:, None]
+        u = cand[idx][None, :]
+        a = d(heads, u) + d(u, tails) - lam * d(heads, tails)
+        pos = np.argmin(a, axis=0)
+        return a[pos, np.arange(len(idx))], nodes[pos]
+
+    # Cached insertion of cand[c]: α = best_alpha[c] on the arc (best_arc[c], next[...])
+    best_alpha, best_arc = scan(np.arange(len(cand)))
+    heap = list(zip(best_alpha.tolist(), range(len(cand)), best_arc.tolist()))
+    heapq.heapify(heap)
+
+    while heap:
+        a_k, c, i = heapq.heappop(heap)
+        if not alive[c] or best_alpha[c] != a_k or best_arc[c] != i:
+            continue  # stale entry
+
+        # Insert k between i and j
+        k = int(cand[c])
+        j = next[i]
+        pos = int(position[i]) + 1
+        route.insert(pos, k)
+        position[route[pos:]] = np.arange(pos, len(route))
+        next[i] = k
+        next[k] = j
+        load += int(demands[k])
+        unrouted.remove(k)
+        alive[c] = False
+
+        alive &= demands[cand] <= instance.capacity - load
+        if not alive.any():
+            break
+
+        # Entries whose arc (i, j) was removed are recomputed
+        lost = np.nonzero(alive & (best_arc == i))[0]
+        changed = [lost]
+        if len(lost):
+            best_alpha[lost], best_arc[lost] = scan(lost)
+
+        # The others keep the lowest (α, position) among their arc and the new ones
+        kept = alive & (best_arc != i)
+        kept[lost] = False
+        u = cand
+        for head, tail in ((i, k), (k, j)):
+            a = d(head, u) + d(u, tail) - lam * d(head, tail)
+            better = kept & ((a < best_alpha) | ((a == best_alpha) & (position[head] < position[best_arc])))
+            best_alpha[better] = a[better]
+            best_arc[better] = head
+            changed.append(np.nonzero(better)[0])
 
-def sweep_constructive_heuristic(instance: CVRPInstance) -> List[List[int]]:
+        changed = np.unique(np.concatenate(changed))
+        for entry in zip(best_alpha[changed].tolist(), changed.tolist(), best_arc[changed].tolist()):
+            heapq.heappush(heap, entry)
+
+
+def _random_insertion(route: List[int], load: int, unrouted: set, instance: CVRPInstance,
+                      lam: float, rcl_alpha: float, rng: random.Random):
+    """
+    Draws a (customer, position) pair from the insertion RCL of the randomized
+    Mole & Jameson heuristic. Returns (None, None) if no customer fits.
+    """
+    dist = instance.distance_rows
+    demands = instance.demands
+    candidates = []
+    for u in sorted(unrouted):
+        if load + demands[u] > instance.capacity:
+            continue
+        for pos in range(len(route) - 1):
+            i = route[pos]
+            j = route[pos + 1]
+            candidates.append((dist[i][u] + dist[u][j] - lam * dist[i][j], u, pos + 1))
+
+    if not candidates:
+        return None, None
+    a_min = min(c[0] for c in candidates)
+    a_max = max(c[0] for c in candidates)
+    threshold = a_min + rcl_alpha * (a_max - a_min)
+    _, u, pos = rng.choice([c for c in candidates if c[0] <= threshold])
+    return u, pos
+
+
+def sweep_constructive_heuristic(instance: CVRPInstance, rcl_alpha: float = 0.0,
+                                 rng: Optional[random.Random] = None) -> List[List[int]]:
     """
     Implements the Sweep Algorithm for the CVRP.
     
     1. Calculates polar angles for all customers relative to the depot.
     2. Sorts customers by angle.
     3. Greedily builds routes respecting capacity constraints.
+
+    With rcl_alpha > 0 and an rng (GRASP), the sweep starts at a random
+    customer and each next customer is drawn from the remaining customers
+    within rcl_alpha * 2π radians of the next one in angular order.
     """
     
-    # 1. Get Depot Coordinates
-    depot_x, depot_y = instance.coords[instance.depot]
-    
-    # 2. Calculate Polar Angles for all customers
-    # Store as list of tuples: (customer_index, angle)
-    customer_angles: List[Tuple[int, float]] = []
-    
-    # Iterate over nodes, skipping the depot (index 0)
-    for i in instance.nodes:
-        if i == instance.depot:
-            continue
-            
-        x, y = instance.coords[i]
-        
-        # math.atan2 returns value between -pi and pi
-        angle = math.atan2(y - depot_y, x - depot_x)
-        customer_angles.append((i, angle))
-    
-    # 3. Sort customers by angle (sweeping motion)
-    customer_angles.sort(key=lambda x: x[1])
-    
+    customer_angles = _sweep_order(instance, rcl_alpha, rng)
+
     # 4. Construct Routes (Clustering)
     routes: List[List[int]] = []
     current_route: List[int] = [instance.depot]
@@ -214,3 +403,135 @@ def sweep_constructive_heuristic(instance: CVRPInstance) -> List[List[int]]:
         
     return routes
 
+
+def split_constructive_heuristic(instance: CVRPInstance, rcl_alpha: float = 0.0,
+                                 rng: Optional[random.Random] = None) -> List[List[int]]:
+    """
+    Route-first, cluster-second (Beasley, 1983): the customers in sweep order
+    form a giant tour, which `split` cuts into the optimal set of routes.
+
+    rcl_alpha and rng randomize the sweep order as in
+    sweep_constructive_heuristic.
+    """
+    giant_tour = [customer for customer, _ in _sweep_order(instance, rcl_alpha, rng)]
+    return split(instance, giant_tour)
+
+
+def split(instance: CVRPInstance, giant_tour: List[int]) -> List[List[int]]:
+    """
+    Optimal Split of a giant tour (a sequence of all customers, no depot)
+    into capacity-feasible routes that visit the customers in the same order,
+    with unlimited fleet.
+
+    The best cut points are the shortest path from 0 to n in the DAG whose arc
+    (i, j) is the route giant_tour[i..j-1]. With
+        p[i]          cost of the best split of the first i customers
+        D[i]          distance along the tour from its first customer to customer i
+    the cost of the route after cut i ending with customer t is
+        p[i] + c(0, t_{i+1}) - D[i+1] + D[t] + c(t, 0),
+    so the best predecessor of t is the feasible cut with the lowest key
+    p[i] + c(0, t_{i+1}) - D[i+1]. A deque keeps the candidate cuts with
+    increasing keys (cuts that are both worse and have less spare capacity
+    than a later one are dropped), giving O(n) time (Vidal, 2016).
+
+    Raises ValueError if a customer's demand exceeds the vehicle capacity.
+    """
+    dist = instance.distance_rows
+    demands = instance.demands
+    capacity = instance.capacity
+    depot = instance.depot
+    n = len(giant_tour)
+
+    # 1-based arrays over the tour; entry n + 1 is a sentinel
+    tour = [depot] + list(giant_tour)
+    load = [0] * (n + 2)
+    along = [0] * (n + 2)
+    for t in range(1, n + 1):
+        if demands[tour[t]] > capacity:
+            raise ValueError(f"Customer {tour[t]} has demand {demands[tour[t]]} > capacity {capacity}.")
+        load[t] = load[t - 1] + demands[tour[t]]
+        if t > 1:
+            along[t] = along[t - 1] + dist[tour[t - 1]][tour[t]]
+    load[n + 1] = load[n]
+    along[n + 1] = along[n]
+
+    def key(i):
+        return p[i] + dist[depot][tour[i + 1]] - along[i + 1]
+
+    p = [0] * (n + 1)
+    pred = [0] * (n + 1)
+    cuts = deque([0])
+    for t in range(1, n + 1):
+        i = cuts[0]
+        p[t] = key(i) + along[t] + dist[tour[t]][depot]
+        pred[t] = i
+        if t < n:
+            key_t = key(t)
+            while cuts and key(cuts[-1]) >= key_t:
+                cuts.pop()
+            cuts.append(t)
+            while load[t + 1] - load[cuts[0]] > capacity:
+                cuts.popleft()
+
+    routes = []
+    t = n
+    while t > 0:
+        routes.append([depot] + tour[pred[t] + 1:t + 1])
+        t = pred[t]
+    routes.reverse()
+    return routes
+
+
+def _sweep_order(instance: CVRPInstance, rcl_alpha: float = 0.0,
+                 rng: Optional[random.Random] = None) -> List[Tuple[int, float]]:
+    """
+    Customers as (customer, polar angle) pairs in sweep order (randomized
+    with rcl_alpha > 0 and an rng, see _random_sweep_order).
+    """
+
+    # 1. Get Depot Coordinates
+    depot_x, depot_y = instance.coords[instance.depot]
+    
+    # 2. Calculate Polar Angles for all customers
+    # Store as list of tuples: (customer_index, angle)
+    customer_angles: List[Tuple[int, float]] = []
+    
+    # Iterate over nodes, skipping the depot (index 0)
+    for i in instance.nodes:
+        if i == instance.depot:
+            continue
+            
+        x, y = instance.coords[i]
+        
+        # math.atan2 returns value between -pi and pi
+        angle = math.atan2(y - depot_y, x - depot_x)
+        customer_angles.append((i, angle))
+    
+    # 3. Sort customers by angle (sweeping motion)
+    customer_angles.sort(key=lambda x: x[1])
+
+    if rng is not None and rcl_alpha > 0 and customer_angles:
+        customer_angles = _random_sweep_order(customer_angles, rcl_alpha, rng)
+
+    return customer_angles
+
+
+def _random_sweep_order(customer_angles: List[Tuple[int, float]], rcl_alpha: float,
+                        rng: random.Random) -> List[Tuple[int, float]]:
+    """
+    Randomized sweep order: rotate the angle-sorted customers to a random
+    start, then repeatedly take a random customer among the remaining ones
+    within rcl_alpha * 2π radians (of sweep) of the first remaining one.
+    """
+    start = rng.randrange(len(customer_angles))
+    remaining = customer_angles[start:] + [(c, a + 2 * math.pi) for c, a in customer_angles[:start]]
+    width = rcl_alpha * 2 * math.pi
+
+    order = []
+    while remaining:
+        limit = remaining[0][1] + width
+        k = 1
+        while k < len(remaining) and remaining[k][1] <= limit:
+            k += 1
+        order.append(remaining.pop(rng.randrange(k)))
+    return order
@@ -0,0 +1,186 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from math import atan2, ceil
+from sys import argv
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from utils import *
+from grasp import construct
+from local_search import local_search
+from solution import SolutionState
+from shared import SharedInstance, SharedInstanceHandle, attach_instance
+
+# Customers per subproblem (default of decompose)
+GROUP_SIZE = 200
+
+
+def route_angles(instance: CVRPInstance, routes: List[List[int]]) -> List[float]:
+    """
+    Polar angle, around the depot, of the centroid of each route.
+    """
+    x_0, y_0 = instance.coords[0]
+    angles = []
+    for route in routes:
+        xs = [instance.coords[v][0] for v in route[1:]]
+        ys = [instance.coords[v][1] for v in route[1:]]
+        angles.append(atan2(sum(ys) / len(ys) - y_0, sum(xs) / len(xs) - x_0))
+    return angles
+
+
+def partition_routes(instance: CVRPInstance, routes: List[List[int]], group_size: int = GROUP_SIZE,
+                     offset: int = 0) -> List[List[int]]:
+    """
+    Splits the routes into groups of consecutive centroid angles (as the
+    sweep heuristic orders customers), each with about `group_size`
+    customers. The angular order starts at its `offset`-th route, so that
+    successive offsets give shifted partitions. A last group smaller than
+    half a group joins the previous one.
+
+    Returns the route indices of each group.
+    """
+    angles = route_angles(instance, routes)
+    order = sorted(range(len(routes)), key=lambda r: angles[r])
+    if order:
+        offset %= len(order)
+        order = order[offset:] + order[:offset]
+
+    groups: List[List[int]] = []
+    sizes: List[int] = []
+    for r in order:
+        if not groups or sizes[-1] >= group_size:
+            groups.append([])
+            sizes.append(0)
+        groups[-1].append(r)
+        sizes[-1] += len(routes[r]) - 1
+    if len(groups) > 1 and sizes[-1] < group_size / 2:
+        groups[-2].extend(groups.pop())
+    return groups
+
+
+def subproblem(instance: CVRPInstance, routes: List[List[int]]) -> Tuple[CVRPInstance, List[int], List[List[int]]]:
+    """
+    The CVRP restricted to the depot and the customers of `routes`. Returns
+    the sub-instance, its nodes (ids in `instance`, depot first) and the
+    routes renumbered accordingly. Distances are copied from `instance`
+    (recomputed on demand with the lean backend).
+    """
+    nodes = [0] + [v for route in routes for v in route[1:]]
+    local = {v: k for k, v in enumerate(nodes)}
+    coords = np.asarray(instance.coords, dtype=np.float64)[nodes]
+    matrix = None
+    if instance.backend != "lean":
+        matrix = np.ascontiguousarray(instance.distance_matrix[np.ix_(nodes, nodes)])
+    sub = CVRPInstance(coords, [instance.demands[v] for v in nodes], instance.capacity, instance.rounding,
+                       distance_matrix=matrix, backend=instance.backend)
+    return sub, nodes, [[local[v] for v in route] for route in routes]
+
+
+def solve_subproblem(handle: SharedInstanceHandle, routes: List[List[int]], time_limit: float,
+                     periodic_break: int, tau_reduction: int, search_args: dict) -> Tuple[List[List[int]], float]:
+    """
+    Local search on the subproblem made of `routes` (worker of decompose).
+    Returns the best routes found, in the ids of the full instance, and
+    their cost.
+    """
+    instance = attach_instance(handle)
+    sub, nodes, local_routes = subproblem(instance, routes)
+    improved, cost, _, _ = local_search(local_routes, sub, perf_counter(), time_limit, periodic_break,
+                                       tau_reduction, verbose=False, **search_args)
+    return [[nodes[v] for v in route] for route in improved], cost
+
+
+def decompose(instance: CVRPInstance, routes: List[List[int]], time_limit: float = 60 * 30,
+              group_size: int = GROUP_SIZE, subproblem_time: float = 60, workers: Optional[int] = None,
+              periodic_break: int = 0, tau_reduction: int = 0, max_rounds: Optional[int] = None,
+              verbose: bool = True, **search_args):
+    """
+    Decomposition for large instances: the routes are partitioned into
+    groups of about `group_size` customers by the polar angle of their
+    centroids (partition_routes), each group is solved as an independent
+    sub-CVRP by local_search on `workers` processes (default: one per CPU)
+    for at most `subproblem_time` seconds, and the improved routes are
+    merged back. With more groups than workers the subproblems run in
+    waves, so each one also gets at most its share of the remaining time. Each round shifts the partition by half a group, so that
+    routes on the border of two groups end up in the same one. Rounds run
+    until `time_limit` seconds or `max_rounds` rounds.
+
+    A subproblem never returns routes worse than its input, so the cost
+    never increases. Other keyword arguments go to local_search (e.g.
+    granular_k, extra_operators, exploration, stagnation_iterations).
+
+    Returns (routes, cost, time to best, rounds).
+    """
+    workers = workers or os.cpu_count() or 1
+    start = time.time()
+    deadline = start + time_limit
+    routes = [list(route) for route in routes]
+    cost = SolutionState(routes, instance).total_cost()
+    best_time = 0.0
+    rounds = 0
+    offset = 0
+
+    with SharedInstance(instance) as shared, ProcessPoolExecutor(max_workers=workers) as pool:
+        while max_rounds is None or rounds < max_rounds:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+
+            groups = partition_routes(instance, routes, group_size, offset)
+            waves = ceil(len(groups) / workers)
+            budget = min(subproblem_time, remaining / waves)
+            futures = [pool.submit(solve_subproblem, shared.handle, [routes[r] for r in group],
+                                   budget, periodic_break, tau_reduction, search_args)
+                       for group in groups]
+            results = [future.result() for future in futures]
+            routes = [route for improved, _ in results for route in improved]
+            round_cost = sum(group_cost for _, group_cost in results)
+            rounds += 1
+            offset += max(1, len(groups[0]) // 2)
+
+            if round_cost < cost:
+                cost = round_cost
+                best_time = time.time() - start
+            if verbose:
+                print(f"Round {rounds}: {len(groups)} subproblems, cost {cost}")
+
+    return routes, cost, best_time, rounds
+
+
+if __name__ == "__main__":
+    # python decomposition.py <instance_index> <algorithm_id> <periodic_break> <tau_reduction>
+    #                         [group_size] [workers] [subproblem_time] [backend]
+    inst = int(argv[1])
+    filename = instances_path + instances[inst]
+    construction = argv[2]
+    periodic_break = int(argv[3])
+    tau_reduction = int(argv[4])
+    group_size = int(argv[5]) if len(argv) > 5 else GROUP_SIZE
+    workers = int(argv[6]) if len(argv) > 6 else None
+    subproblem_time = float(argv[7]) if len(argv) > 7 else 60
+    backend = argv[8] if len(argv) > 8 else "dense"
+    time_limit = 60 * 30
+
+    start = time.time()
+    instance = read_instance(filename, backend=backend)
+    initial = construct(instance, construction)
+    print(f"Initial cost: {SolutionState(initial, instance).total_cost()}")
+    offset = time.time() - start
+    best_sol, cost, time_best, rounds = decompose(
+        instance, initial, time_limit - offset, group_size, subproblem_time, workers,
+        periodic_break, tau_reduction)
+    time_best += offset
+    total_time = time.time() - start
+
+    print(filename)
+    print(construction)
+    print(f"Rounds: {rounds}")
+    print("Best solution")
+    print(best_sol)
+    print(f"Best cost: {cost}")
+
+    with open(f"results/decomposition_instance_{inst+1}_{construction}_{periodic_break}_{tau_reduction}.out", 'w') as file:
+        file.write(f"{inst+1};{construction};{total_time};{cost};{time_best}\n")
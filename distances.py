@@ -0,0 +1,227 @@
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# Rounding rules applied to the Euclidean distance d(i, j):
+#   "floor" -> floor(d)          (what this project has always used)
+#   "nint"  -> floor(d + 0.5)    (TSPLIB EUC_2D, see vrp_instances/readme.txt)
+#   "ceil"  -> ceil(d)           (TSPLIB CEIL_2D)
+#   "exact" -> d, kept as float32
+ROUNDING_RULES = ("floor", "nint", "ceil", "exact")
+
+# Number of matrix rows built per broadcast. Bounds the float64 temporaries to
+# about BLOCK_ROWS * n * 8 bytes, so very large instances do not need an n x n
+# float64 scratch matrix on top of the result. On very large instances the
+# blocks are further limited to BLOCK_ELEMENTS entries.
+BLOCK_ROWS = 2048
+BLOCK_ELEMENTS = 1 << 22
+
+# Rows kept by the row cache of LazyDistanceMatrix (the lean backend)
+ROW_CACHE_SIZE = 1024
+
+
+def block_rows(n: int) -> int:
+    return max(1, min(BLOCK_ROWS, BLOCK_ELEMENTS // max(n, 1)))
+
+
+def distance_dtype(rounding: str) -> np.dtype:
+    """
+    Returns the storage type used for a rounding rule: int32 for the integer
+    rules and float32 for "exact".
+    """
+    if rounding not in ROUNDING_RULES:
+        raise ValueError(f"Unknown rounding rule '{rounding}', expected one of {ROUNDING_RULES}.")
+    return np.dtype(np.float32) if rounding == "exact" else np.dtype(np.int32)
+
+
+def round_distances(d: np.ndarray, rounding: str) -> np.ndarray:
+    """
+    Applies a rounding rule to an array of float64 Euclidean distances.
+    """
+    dtype = distance_dtype(rounding)
+    if rounding == "floor":
+        d = np.floor(d)
+    elif rounding == "nint":
+        d = np.floor(d + 0.5)
+    elif rounding == "ceil":
+        d = np.ceil(d)
+    return d.astype(dtype)
+
+
+def compute_distance_matrix(coords: Union[np.ndarray, Sequence[Tuple[float, float]]],
+                            rounding: str = "floor") -> np.ndarray:
+    """
+    Builds the full n x n distance matrix with array broadcasting.
+
+    Parameters
+    ----------
+    coords : array-like of shape (n, 2)
+        Node coordinates, depot first.
+    rounding : str
+        One of ROUNDING_RULES.
+
+    Returns
+    -------
+    np.ndarray
+        int32 matrix for the integer rules, float32 matrix for "exact".
+    """
+    xy = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    n = len(xy)
+    dist = np.empty((n, n), dtype=distance_dtype(rounding))
+    x = xy[:, 0]
+    y = xy[:, 1]
+    step = block_rows(n)
+    for start in range(0, n, step):
+        stop = min(start + step, n)
+        dx = x[start:stop, None] - x[None, :]
+        dy = y[start:stop, None] - y[None, :]
+        dist[start:stop] = round_distances(np.sqrt(dx * dx + dy * dy), rounding)
+    return dist
+
+
+def matrix_rows(dist: np.ndarray) -> List[memoryview]:
+    """
+    Returns one memoryview per matrix row.
+
+    rows[i][j] reads straight from the compact array and yields a plain
+    Python number, which is much cheaper in scalar loops than indexing the
+    NumPy array (no NumPy scalar is created per lookup).
+    """
+    return [memoryview(row) for row in dist]
+
+
+def nearest_neighbors(dist: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the k nearest nodes of every node (itself excluded), closest first.
+
+    Parameters
+    ----------
+    dist : np.ndarray or LazyDistanceMatrix
+        n x n distance matrix.
+    k : int
+        Number of neighbors, clipped to n - 1.
+
+    Returns
+    -------
+    np.ndarray
+        n x k int32 matrix of node indices.
+    """
+    n = len(dist)
+    k = max(0, min(k, n - 1))
+    result = np.empty((n, k), dtype=np.int32)
+    if k == 0:
+        return result
+    step = block_rows(n)
+    for start in range(0, n, step):
+        stop = min(start + step, n)
+        block = dist[start:stop].astype(np.float64)
+        block[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        # Keep everything closer than the k-th distance, then the lowest
+        # indices among the ties, so the lists are deterministic
+        kth = np.partition(block, k - 1, axis=1)[:, k - 1:k]
+        ties = block == kth
+        need = k - (block < kth).sum(axis=1, keepdims=True)
+        selected = (block < kth) | (ties & (np.cumsum(ties, axis=1) <= need))
+        part = np.nonzero(selected)[1].reshape(-1, k)
+        order = np.argsort(np.take_along_axis(block, part, axis=1), axis=1, kind="stable")
+        result[start:stop] = np.take_along_axis(part, order, axis=1)
+    return result
+
+
+class LazyDistanceMatrix:
+    """
+    Memory-lean stand-in for the dense distance matrix: only the coordinates
+    are stored and distances are computed on demand, with the same rounding
+    (and so the same values) as compute_distance_matrix.
+
+    It supports the NumPy-style reads the solver makes on distance_matrix:
+        m[i]        row i (kept in a bounded row cache)
+        m[i:j]      block of rows
+        m[a, b]     distances between broadcast index arrays (or ints/slices)
+    plus shape, dtype, len() and astype(), which only changes the type of the
+    results. `rows` replaces distance_rows: rows[i][j] is a plain Python
+    number read from a cached row.
+
+    Memory is O(n) for the coordinates plus at most `max_rows` rows.
+    """
+
+    def __init__(self, coords: Union[np.ndarray, Sequence[Tuple[float, float]]], rounding: str = "floor",
+                 max_rows: int = ROW_CACHE_SIZE, dtype: Optional[np.dtype] = None):
+        xy = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.x = np.ascontiguousarray(xy[:, 0])
+        self.y = np.ascontiguousarray(xy[:, 1])
+        self.rounding = rounding
+        self.dtype = np.dtype(dtype) if dtype is not None else distance_dtype(rounding)
+        n = len(xy)
+        self.shape = (n, n)
+        self.ndim = 2
+        self.max_rows = max(1, max_rows)
+        self.rows = _RowCache(self)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def _distances(self, dx: np.ndarray, dy: np.ndarray) -> np.ndarray:
+        return round_distances(np.sqrt(dx * dx + dy * dy), self.rounding).astype(self.dtype, copy=False)
+
+    def _row(self, i: int) -> np.ndarray:
+        row = self._distances(self.x[i] - self.x, self.y[i] - self.y)
+        row.flags.writeable = False
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            a, b = key
+            if isinstance(a, slice) or isinstance(b, slice):
+                # Same result shape as the array: the slice keeps its own axis
+                a = np.arange(self.shape[0])[a] if isinstance(a, slice) else np.asarray(a)
+                b = np.arange(self.shape[1])[b] if isinstance(b, slice) else np.asarray(b)
+                if isinstance(key[0], slice):
+                    a = a.reshape((-1,) + (1,) * b.ndim)
+                else:
+                    a = a[..., None]
+            return self._distances(self.x[a] - self.x[b], self.y[a] - self.y[b])
+        if isinstance(key, slice):
+            rows = np.arange(self.shape[0])[key]
+            return self._distances(self.x[rows, None] - self.x[None, :], self.y[rows, None] - self.y[None, :])
+        return self.rows.array(int(key))
+
+    def astype(self, dtype, copy: bool = True) -> "LazyDistanceMatrix":
+        return LazyDistanceMatrix(np.column_stack((self.x, self.y)), self.rounding, self.max_rows, dtype)
+
+
+class _RowCache:
+    """
+    Bounded cache of the rows of a LazyDistanceMatrix, indexed like
+    distance_rows (rows[i] -> memoryview). When full, the oldest row is
+    dropped: hits cost a single dict lookup.
+    """
+
+    def __init__(self, matrix: LazyDistanceMatrix):
+        self.matrix = matrix
+        self._views: Dict[int, memoryview] = {}
+        self._arrays: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def _load(self, i: int) -> memoryview:
+        if len(self._views) >= self.matrix.max_rows:
+            oldest = next(iter(self._views))
+            del self._views[oldest]
+            del self._arrays[oldest]
+        row = self.matrix._row(i)
+        self._arrays[i] = row
+        self._views[i] = view = memoryview(row)
+        return view
+
+    def __getitem__(self, i: int) -> memoryview:
+        try:
+            return self._views[i]
+        except KeyError:
+            return self._load(i)
+
+    def array(self, i: int) -> np.ndarray:
+        if i not in self._arrays:
+            self._load(i)
+        return self._arrays[i]
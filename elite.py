@@ -0,0 +1,214 @@
+import random
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from utils import CVRPInstance
+from solution import SolutionState
+
+Arc = Tuple[int, int]
+
+
+class EliteSolution(NamedTuple):
+    cost: float
+    routes: List[List[int]]
+    arcs: FrozenSet[Arc]
+
+
+def solution_arcs(routes: List[List[int]]) -> FrozenSet[Arc]:
+    """
+    Undirected arcs (i < j) of a solution, depot arcs included.
+    """
+    arcs = set()
+    for route in routes:
+        for k in range(1, len(route)):
+            a, b = route[k - 1], route[k]
+            arcs.add((a, b) if a < b else (b, a))
+        arcs.add((0, route[-1]))
+    return frozenset(arcs)
+
+
+def arc_distance(a: FrozenSet[Arc], b: FrozenSet[Arc]) -> int:
+    """
+    Number of arcs of `a` missing from `b`.
+    """
+    return len(a - b)
+
+
+class ElitePool:
+    """
+    Bounded pool of distinct good solutions (Resende & Ribeiro, 2005).
+
+    A solution enters a pool that is not full when it differs from every
+    elite solution in at least `min_diversity` (a fraction of its arcs); a
+    new overall best only has to differ from them. When the pool is full, it
+    must also beat the worst elite solution, and replaces the elite solution
+    closest to it among those it beats. Elite solutions are kept sorted by
+    cost.
+    """
+
+    def __init__(self, max_size: int = 10, min_diversity: float = 0.05):
+        self.max_size = max_size
+        self.min_diversity = min_diversity
+        self.solutions: List[EliteSolution] = []
+
+    def __len__(self) -> int:
+        return len(self.solutions)
+
+    def __iter__(self):
+        return iter(self.solutions)
+
+    @property
+    def best(self) -> Optional[EliteSolution]:
+        return self.solutions[0] if self.solutions else None
+
+    def admits(self, cost: float) -> bool:
+        """
+        Cheap test made before copying a candidate: False when `cost` alone
+        keeps it out of the pool.
+        """
+        return len(self.solutions) < self.max_size or cost < self.solutions[-1].cost
+
+    def add(self, routes: List[List[int]], cost: float) -> bool:
+        """
+        Offers a solution to the pool (`routes` is stored, not copied).
+        Returns True when it entered.
+        """
+        if not self.admits(cost):
+            return False
+        arcs = solution_arcs(routes)
+        distances = [arc_distance(arcs, elite.arcs) for elite in self.solutions]
+        if 0 in distances:
+            return False
+        new_best = not self.solutions or cost < self.solutions[0].cost
+        if not new_best and min(distances) < self.min_diversity * len(arcs):
+            return False
+
+        candidate = EliteSolution(cost, routes, arcs)
+        if len(self.solutions) >= self.max_size:
+            worse = [k for k, elite in enumerate(self.solutions) if elite.cost > cost]
+            del self.solutions[min(worse, key=lambda k: distances[k])]
+        self.solutions.append(candidate)
+        self.solutions.sort(key=lambda elite: elite.cost)
+        return True
+
+    # ---- Checkpoints ----
+
+    def to_dict(self) -> Dict:
+        return {
+            "max_size": self.max_size,
+            "min_diversity": self.min_diversity,
+            "solutions": [[elite.cost, elite.routes] for elite in self.solutions],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ElitePool":
+        pool = cls(data["max_size"], data["min_diversity"])
+        pool.solutions = [EliteSolution(cost, routes, solution_arcs(routes)) for cost, routes in data["solutions"]]
+        return pool
+
+    def guide(self, routes: List[List[int]], rng: Optional[random.Random] = None) -> Optional[EliteSolution]:
+        """
+        Elite solution to relink `routes` with: drawn with probability
+        proportional to its distance to `routes` when an rng is given, the
+        most distant one otherwise. None when every elite solution equals
+        `routes`.
+        """
+        arcs = solution_arcs(routes)
+        distances = [arc_distance(arcs, elite.arcs) for elite in self.solutions]
+        if not distances or max(distances) == 0:
+            return None
+        if rng is None:
+            return self.solutions[distances.index(max(distances))]
+        return rng.choices(self.solutions, weights=distances)[0]
+
+
+def path_relinking(instance: CVRPInstance, initial: List[List[int]],
+                   guide: List[List[int]]) -> Optional[Tuple[List[List[int]], float]]:
+    """
+    Greedy path relinking from `initial` towards `guide`.
+
+    Each step gives one customer v the predecessor it has in the guide,
+    using the moves of the local search: v is reinserted right after that
+    predecessor or, when it starts a route of the guide, its route is broken
+    before it (break-route). Among the capacity-feasible steps that bring
+    the solution closer to the guide, the cheapest one is applied, until the
+    guide is reached or no such step is left.
+
+    Returns the best intermediate solution of the path and its cost (the end
+    points excluded), or None when the path has none. It is not a local
+    optimum: the local search is meant to run from it.
+    """
+    D = instance.distance_rows
+    demands = instance.demands
+    capacity = instance.capacity
+    state = SolutionState(initial, instance)
+    pred = state.pred
+    succ = state.succ
+    route_of = state.route_of
+    position = state.position
+
+    # Predecessor of every customer in the guide (0 for the first of a route)
+    target = [0] * instance.nnodes
+    for route in guide:
+        for k in range(1, len(route)):
+            target[route[k]] = route[k - 1]
+    unmatched = {v for v in range(1, instance.nnodes) if pred[v] != target[v]}
+
+    cost = state.total_cost()
+    best = None
+    best_cost = float('inf')
+    while len(unmatched) > 1:
+        sel_v = -1
+        sel_delta = float('inf')
+        for v in unmatched:
+            p = target[v]
+            u = pred[v]
+            s = succ[v]
+            if p == 0:
+                # Break-route before v: only v changes predecessor
+                delta = D[u][0] + D[0][v] - D[u][v]
+            else:
+                if route_of[p] != route_of[v] and state.load[route_of[p]] + demands[v] > capacity:
+                    continue
+                q = succ[p]
+                delta = D[u][s] - D[u][v] - D[v][s] + D[p][v] + D[v][q] - D[p][q]
+                # v gets its guide predecessor; s now follows u, q follows v
+                gain = 1
+                if s:
+                    gain += (target[s] == u) - (target[s] == v)
+                if q and target[q] == v:
+                    gain += 1
+                if gain <= 0:
+                    continue
+            if delta < sel_delta:
+                sel_v = v
+                sel_delta = delta
+        if sel_v == -1:
+            break
+
+        v = sel_v
+        p = target[v]
+        touched = [v, succ[v]]
+        if p == 0:
+            state.split(route_of[v], position[v])
+        else:
+            touched.append(succ[p])
+            r_1, i = route_of[v], position[v]
+            r_2, j = route_of[p], position[p] + 1
+            if r_1 == r_2 and i < j:
+                j -= 1
+            state.relocate(r_1, i, r_2, j)
+        for w in touched:
+            if w:
+                if pred[w] == target[w]:
+                    unmatched.discard(w)
+                else:
+                    unmatched.add(w)
+
+        cost += sel_delta
+        if unmatched and cost < best_cost:
+            best = state.copy_routes()
+            best_cost = cost
+
+    if best is None:
+        return None
+    return best, best_cost
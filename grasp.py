@@ -0,0 +1,157 @@
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from sys import argv
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+from utils import *
+from construction import *
+from local_search import local_search
+from elite import ElitePool, path_relinking
+from shared import SharedInstance, SharedInstanceHandle, attach_instance
+
+
+# Savings heuristic neighborhood with the lean backend: all-pairs savings
+# would take O(n²) memory
+LEAN_SAVINGS_NEIGHBORS = 100
+
+
+def construct(instance: CVRPInstance, construction: str, rcl_alpha: float = 0.0,
+              rng: Optional[random.Random] = None) -> List[List[int]]:
+    """
+    Runs the constructive heuristic selected by `construction`, with the same
+    ids as main.py: "0" savings, "1" insertion, "3" sweep + split, anything
+    else sweep.
+    rcl_alpha = 0 gives the deterministic (greedy) version. On lean instances
+    the savings are limited to the LEAN_SAVINGS_NEIGHBORS nearest neighbors.
+    """
+    if construction == "0":
+        neighbors = LEAN_SAVINGS_NEIGHBORS if instance.backend == "lean" else None
+        return savings_constructive_heuristic(instance, rcl_alpha=rcl_alpha, rng=rng, neighbors=neighbors)
+    elif construction == "1":
+        return insertion_constructive_heuristic(instance, lam=1, rcl_alpha=rcl_alpha, rng=rng)
+    elif construction == "3":
+        return split_constructive_heuristic(instance, rcl_alpha=rcl_alpha, rng=rng)
+    else:
+        return sweep_constructive_heuristic(instance, rcl_alpha=rcl_alpha, rng=rng)
+
+
+def grasp_worker(handle: SharedInstanceHandle, construction: str, alpha: float, start: float, deadline: float,
+                 iteration_time: float, periodic_break: int, tau_reduction: int, seed: int,
+                 greedy_first: bool = False, elite_size: int = 0) -> Tuple[List[List[int]], float, float, int]:
+    """
+    Runs GRASP iterations (randomized construction + local search) until the
+    wall-clock `deadline` (time.time()). Each local search gets at most
+    `iteration_time` seconds.
+
+    With `elite_size` > 0, the local optima of the iterations are kept in an
+    elite pool of that size and each one is relinked with an elite solution
+    (GRASP with path relinking); the best solution of the path gets a local
+    search of its own.
+
+    Returns the best solution, its cost, the time (since `start`) it was
+    found and the number of iterations done.
+    """
+    rng = random.Random(seed)
+    instance = attach_instance(handle)
+    pool = ElitePool(elite_size) if elite_size > 0 else None
+
+    best_sol = None
+    best_cost = float('inf')
+    best_time = 0.0
+    iterations = 0
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+
+        offset = time.time() - start
+        # The very first iteration may use the greedy construction, so a run
+        # is never worse than main.py with the same budget
+        alpha_it = 0.0 if greedy_first and iterations == 0 else alpha
+        solution = construct(instance, construction, alpha_it, rng)
+        improved, cost, time_best, _ = local_search(solution, instance, perf_counter(),
+                                                    min(iteration_time, remaining),
+                                                    periodic_break, tau_reduction, verbose=False)
+        iterations += 1
+
+        if pool is not None:
+            guide = pool.guide(improved, rng)
+            pool.add(improved, cost)
+            relinked = path_relinking(instance, improved, guide.routes) if guide is not None else None
+            remaining = deadline - time.time()
+            if relinked is not None and remaining > 0:
+                offset_pr = time.time() - start
+                relinked, cost_pr, time_pr, _ = local_search(relinked[0], instance, perf_counter(),
+                                                             min(iteration_time, remaining),
+                                                             periodic_break, tau_reduction, verbose=False)
+                pool.add(relinked, cost_pr)
+                if cost_pr < cost:
+                    improved, cost, offset, time_best = relinked, cost_pr, offset_pr, time_pr
+
+        if cost < best_cost:
+            best_sol = improved
+            best_cost = cost
+            best_time = offset + time_best
+
+    return best_sol, best_cost, best_time, iterations
+
+
+def grasp(filename: str, construction: str, alpha: float = 0.1, time_limit: float = 60 * 30,
+          iteration_time: float = 60, workers: Optional[int] = None, periodic_break: int = 0,
+          tau_reduction: int = 0, seed: int = 0, backend: str = "dense", elite_size: int = 0):
+    """
+    Multi-start GRASP (Feo & Resende, 1995): independent randomized
+    construction + local search iterations run on `workers` processes
+    (default: one per CPU) under a shared wall-clock budget of `time_limit`
+    seconds. Worker w uses seed + w; worker 0 starts from the greedy
+    construction. The instance is read once and shared with the workers
+    through shared memory (coordinates only with backend="lean").
+    `elite_size` > 0 adds path relinking to each worker (see grasp_worker).
+
+    Returns (best solution, best cost, time to best, iterations, total time).
+    """
+    workers = workers or os.cpu_count() or 1
+    start = time.time()
+    deadline = start + time_limit
+
+    with SharedInstance(read_instance(filename, backend=backend)) as shared, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(grasp_worker, shared.handle, construction, alpha, start, deadline,
+                               iteration_time, periodic_break, tau_reduction, seed + w, w == 0, elite_size)
+                   for w in range(workers)]
+        results = [future.result() for future in futures]
+
+    best_sol, best_cost, best_time, _ = min(results, key=lambda result: result[1])
+    iterations = sum(result[3] for result in results)
+    return best_sol, best_cost, best_time, iterations, time.time() - start
+
+
+if __name__ == "__main__":
+    # python grasp.py <instance_index> <algorithm_id> <periodic_break> <tau_reduction>
+    #                 [alpha] [workers] [iteration_time] [elite_size]
+    inst = int(argv[1])
+    filename = instances_path + instances[inst]
+    construction = argv[2]
+    periodic_break = int(argv[3])
+    tau_reduction = int(argv[4])
+    alpha = float(argv[5]) if len(argv) > 5 else 0.1
+    workers = int(argv[6]) if len(argv) > 6 else None
+    iteration_time = float(argv[7]) if len(argv) > 7 else 60
+    elite_size = int(argv[8]) if len(argv) > 8 else 0
+    time_limit = 60 * 30
+
+    best_sol, cost, time_best, iterations, total_time = grasp(
+        filename, construction, alpha, time_limit, iteration_time, workers,
+        periodic_break, tau_reduction, elite_size=elite_size)
+
+    print(filename)
+    print(construction)
+    print(f"GRASP iterations: {iterations}")
+    print("Best solution")
+    print(best_sol)
+    print(f"Best cost: {cost}")
+
+    with open(f"results/grasp_instance_{inst+1}_{construction}_{periodic_break}_{tau_reduction}.out", 'w') as file:
+        file.write(f"{inst+1};{construction};{total_time};{cost};{time_best}\n")
@@ -0,0 +1,120 @@
+from time import perf_counter
+from typing import Callable, Dict, IO, List, Optional, Union
+
+# Callback signature of a convergence trace:
+#     trace(iteration, elapsed, current_cost, best_cost, move)
+# where move is the selected neighborhood ('reinsert', '2-opt', 'intra-swap',
+# 'inter-swap', 'break-route', or an optional one: '2-opt*', 'or-opt',
+# 'swap*') or None when no move was found.
+TraceCallback = Callable[[int, float, float, float, Optional[str]], None]
+
+# Callback signature of local_search(on_improvement=...):
+#     on_improvement(routes, best_cost, elapsed, iteration)
+# called each time the best cost improves, with a copy of the new best routes.
+ImprovementCallback = Callable[[List[List[int]], float, float, int], None]
+
+OPERATORS = ('reinsert', '2-opt', 'intra-swap', 'inter-swap', 'break-route', '2-opt*', 'or-opt', 'swap*')
+
+
+class SearchStats:
+    """
+    Counters filled in by local_search(stats=...).
+
+    For every operator:
+        evaluations[op]  neighborhood evaluations (one per route or route pair
+                         that had to be evaluated; cache hits are not counted)
+        eval_time[op]    seconds spent in those evaluations
+        moves[op]        moves in the evaluated neighborhoods
+        selections[op]   iterations in which the operator's move was applied
+        total_delta[op]  sum of the cost changes of the applied moves
+    and for the whole run `iterations`, `elapsed` (seconds) and `stop_reason`
+    (the stopping rule that ended the search).
+    """
+
+    def __init__(self):
+        self.evaluations: Dict[str, int] = {op: 0 for op in OPERATORS}
+        self.eval_time: Dict[str, float] = {op: 0.0 for op in OPERATORS}
+        self.moves: Dict[str, int] = {op: 0 for op in OPERATORS}
+        self.selections: Dict[str, int] = {op: 0 for op in OPERATORS}
+        self.total_delta: Dict[str, float] = {op: 0 for op in OPERATORS}
+        self.iterations = 0
+        self.elapsed = 0.0
+        self.stop_reason: Optional[str] = None
+
+    def timed(self, op: str, evaluate: Callable, size: Optional[Callable] = None) -> Callable:
+        """
+        Wraps a neighborhood evaluation so its calls are counted and timed
+        under `op`. `size`, called with the same arguments, gives the number
+        of moves of the evaluated neighborhood.
+        """
+        evaluations = self.evaluations
+        eval_time = self.eval_time
+        moves = self.moves
+
+        def wrapper(*args):
+            start = perf_counter()
+            result = evaluate(*args)
+            eval_time[op] += perf_counter() - start
+            evaluations[op] += 1
+            if size is not None:
+                moves[op] += size(*args)
+            return result
+
+        return wrapper
+
+    def record(self, op: Optional[str], delta: float):
+        if op is not None:
+            self.selections[op] += 1
+            self.total_delta[op] += delta
+
+    @property
+    def iterations_per_second(self) -> float:
+        return self.iterations / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def moves_per_second(self) -> float:
+        return sum(self.moves.values()) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        lines = [f"{'operator':<12} {'evals':>10} {'moves':>12} {'time (s)':>10} {'selected':>10} {'delta':>14}"]
+        for op in OPERATORS:
+            lines.append(f"{op:<12} {self.evaluations[op]:>10} {self.moves[op]:>12} {self.eval_time[op]:>10.3f} "
+                         f"{self.selections[op]:>10} {self.total_delta[op]:>14.2f}")
+        lines.append(f"{self.iterations} iterations in {self.elapsed:.2f}s "
+                     f"({self.iterations_per_second:.1f} it/s, {self.moves_per_second:.0f} moves/s)")
+        return "\n".join(lines)
+
+
+class TraceFile:
+    """
+    Convergence trace streamed to a ';'-separated file with the columns
+    iteration;elapsed;current_cost;best_cost;move. Usable as a trace
+    callback and as a context manager.
+    """
+
+    def __init__(self, path: str):
+        self.file: IO[str] = open(path, 'w')
+        self.file.write("iteration;elapsed;current_cost;best_cost;move\n")
+
+    def __call__(self, iteration: int, elapsed: float, current_cost: float, best_cost: float,
+                 move: Optional[str]):
+        self.file.write(f"{iteration};{elapsed:.6f};{current_cost};{best_cost};{move or '-'}\n")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_trace(trace: Union[str, TraceCallback, None]) -> Optional[TraceCallback]:
+    """
+    Accepts a trace given as a file path or a callback; paths are opened as
+    a TraceFile.
+    """
+    if isinstance(trace, str):
+        return TraceFile(trace)
+    return trace
@@ -1,94 +1,393 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence, Set, Tuple, Union
 from utils import CVRPInstance
-from math import sqrt, ceil
+from solution import SolutionState, undo_moves
+from instrumentation import ImprovementCallback, SearchStats, TraceCallback, open_trace
+from checkpoint import save_checkpoint, load_checkpoint
+from elite import ElitePool, path_relinking
+from tabu import TabuMemory, arc
+from math import atan2, ceil, pi, sqrt
 from time import perf_counter
-from copy import deepcopy
-
-def local_search(sol: List[List[int]], I: CVRPInstance, start_time: float, time_limit: float, periodic_break: int, tau_reduction: int):
+import heapq
+import random
+import threading
+
+import numpy as np
+
+import batch_moves
+
+class _MoveCache:
+    """
+    Best moves of each route (2-opt, intra-swap, break-route) and of each route
+    pair (reinsertion, inter-swap), indexed like the routes of the solution.
+    An entry is valid until one of its routes changes or one of their nodes
+    enters or leaves the tabu memory, so after a move only the neighborhoods of
+    the touched routes have to be evaluated again.
+
+    With don't-look bits, `awake` is a second cache of the moves restricted to
+    awake customers, also invalidated when the bits of a route change.
+    """
+    SINGLE = ('2-opt', 'intra-swap', 'break-route')
+    PAIR = ('reinsert', 'inter-swap')
+
+    def __init__(self, nroutes: int, extra_pairs: Sequence[str] = (), dont_look: bool = False):
+        self.pair_ops = self.PAIR + tuple(extra_pairs)
+        self.dont_look = dont_look
+        self.reset(nroutes)
+
+    def reset(self, nroutes: int):
+        self.single = {op: [None] * nroutes for op in self.SINGLE}
+        self.pair = {op: [[None] * nroutes for _ in range(nroutes)] for op in self.pair_ops}
+        self.awake = _MoveCache(nroutes, self.pair_ops[len(self.PAIR):]) if self.dont_look else None
+
+    def invalidate(self, r: int):
+        for entries in self.single.values():
+            entries[r] = None
+        for matrix in self.pair.values():
+            matrix[r] = [None] * len(matrix)
+            for row in matrix:
+                row[r] = None
+        if self.awake is not None:
+            self.awake.invalidate(r)
+
+    def remove(self, r: int):
+        # Route r was deleted: later routes shift one index down
+        for entries in self.single.values():
+            del entries[r]
+        for matrix in self.pair.values():
+            del matrix[r]
+            for row in matrix:
+                del row[r]
+        if self.awake is not None:
+            self.awake.remove(r)
+
+    def append(self):
+        for entries in self.single.values():
+            entries.append(None)
+        for matrix in self.pair.values():
+            for row in matrix:
+                row.append(None)
+            matrix.append([None] * (len(matrix) + 1))
+        if self.awake is not None:
+            self.awake.append()
+
+
+# Optional neighborhoods of local_search(extra_operators=...)
+EXTRA_OPERATORS = ('2-opt*', 'or-opt', 'swap*')
+
+# Ways of exploring the neighborhoods, local_search(exploration=...)
+EXPLORATIONS = ('best', 'first', 'dont-look', 'hybrid')
+
+# Segment lengths moved by Or-opt (single customers are reinsertions)
+OR_OPT_LENGTHS = (2, 3)
+
+# Insertion positions of a customer kept per route by SWAP*: removing the
+# customer it replaces invalidates at most two of them
+SWAP_STAR_POSITIONS = 3
+
+# Smallest neighborhoods that local_search(evaluation="batch") evaluates with
+# NumPy, in customers of the route (2-opt, intra-swap, break-route) or in
+# customer pairs of the two routes (reinsert, inter-swap): below them the
+# scalar loops beat NumPy's per-call overhead (about 25 to 120 microseconds).
+# Reinsertion only counts the customers that fit in the other route, since
+# the scalar loop skips the others.
+BATCH_MIN_SIZE = {'reinsert': 400, '2-opt': 18, 'intra-swap': 12, 'inter-swap': 400, 'break-route': 50}
+
+
+def _polar_sector(angles: List[float]) -> Tuple[float, float]:
+    """
+    Smallest circular sector (start, width) containing the given polar
+    angles: the complement of the largest gap between consecutive angles.
+    """
+    angles = sorted(angles)
+    start = angles[0]
+    gap = angles[0] + 2*pi - angles[-1]
+    for k in range(1, len(angles)):
+        if angles[k] - angles[k-1] > gap:
+            start = angles[k]
+            gap = angles[k] - angles[k-1]
+    return start, 2*pi - gap
+
+
+def _sectors_overlap(a: Tuple[float, float], b: Tuple[float, float]) -> bool:
+    return (b[0] - a[0]) % (2*pi) <= a[1] or (a[0] - b[0]) % (2*pi) <= b[1]
+
+
+def _granular_insertions(near: Set[int], state: SolutionState, r: int) -> List[int]:
+    """
+    Insertion positions of route r (1 .. len-1, as in reinsertion) where the
+    inserted node gets a candidate neighbor `near` as predecessor or
+    successor.
+    """
+    length = len(state.routes[r])
+    route_of = state.route_of
+    position = state.position
+    positions = set()
+    for w in near:
+        if w == 0:
+            positions.add(1)  # inserted right after the depot
+        elif route_of[w] == r:
+            pos = position[w]
+            positions.add(pos)      # inserted right before w
+            if pos + 1 < length:
+                positions.add(pos + 1)  # inserted right after w
+    return sorted(positions)
+
+
+def _granular_swaps(near: Set[int], near_gap: Set[int], state: SolutionState, r: int) -> List[int]:
+    """
+    Positions j of route r (1 .. len-1) whose swap with a node v creates a
+    candidate arc: v gets a neighbor in `near` as predecessor or successor,
+    or the node at j is a neighbor of one of v's current neighbors
+    (`near_gap`), so it lands next to a candidate.
+    """
+    length = len(state.routes[r])
+    route_of = state.route_of
+    position = state.position
+    positions = set()
+    for w in near:
+        if w == 0:
+            positions.add(1)           # depot becomes the predecessor
+            positions.add(length - 1)  # depot becomes the successor
+        elif route_of[w] == r:
+            pos = position[w]
+            if pos + 1 < length:
+                positions.add(pos + 1)  # w becomes the predecessor
+            if pos >= 2:
+                positions.add(pos - 1)  # w becomes the successor
+    for w in near_gap:
+        if w != 0 and route_of[w] == r:
+            positions.add(position[w])
+    return sorted(positions)
+
+
+def local_search(sol: List[List[int]], I: CVRPInstance, start_time: float, time_limit: float, periodic_break: int, tau_reduction: int,
+                 move_cache: bool = True, granular_k: Optional[int] = None, granular_threshold: Optional[float] = None,
+                 evaluation: str = "scalar", verbose: bool = True, stats: Optional[SearchStats] = None,
+                 trace: Union[str, TraceCallback, None] = None, max_iterations: Optional[int] = None,
+                 stagnation_iterations: Optional[int] = None, stagnation_time: Optional[float] = None,
+                 target_cost: Optional[float] = None, stop_event: Optional[threading.Event] = None,
+                 checkpoint: Optional[str] = None, checkpoint_interval: float = 60, resume: Optional[Dict] = None,
+                 on_improvement: Optional[ImprovementCallback] = None, elite: Optional[ElitePool] = None,
+                 relink_after: Optional[int] = None, tabu_attributes: str = "nodes",
+                 extra_operators: Sequence[str] = (), exploration: str = "best", seed: Optional[int] = None):
+    """
+    Tabu search over the reinsert, 2-opt, intra-swap, inter-swap and
+    break-route neighborhoods. With `move_cache` (default) the best move of
+    each route and route pair is kept between iterations and only recomputed
+    for routes changed by the last move or by the tabu memory update.
+
+    `extra_operators` adds inter-route neighborhoods to the five above:
+        "2-opt*"  exchanges the tails of two routes
+        "or-opt"  moves a segment of OR_OPT_LENGTHS customers to another
+                  route, in either orientation
+        "swap*"   exchanges two customers of two routes, each one going to
+                  its best position in the other route (Vidal, 2022)
+    2-opt* and Or-opt moves are evaluated in O(1) from the route prefix
+    loads. SWAP* keeps the SWAP_STAR_POSITIONS best insertion positions of
+    every customer in the other route, so a route pair costs O(L1 * L2)
+    like inter-swap; it only considers route pairs whose polar sectors
+    around the depot overlap, instead of the granular candidate lists.
+    All of them go through the same selection, tabu and aspiration rules.
+    The batch evaluation uses their scalar versions.
+
+    `exploration` selects how each iteration looks for its move:
+        "best"       evaluates every neighborhood over every route and route
+                     pair and applies the best admissible move (default)
+        "first"      visits the neighborhoods and the routes in a random
+                     order (drawn from `seed`) and applies the first
+                     improving move; the best move when none improves
+        "dont-look"  "first" with don't-look bits: a customer goes to sleep
+                     when a scan finds no improving move of the awake
+                     customers, and wakes up when its predecessor or
+                     successor changes. Only the moves that move an awake
+                     customer, or insert next to one, are evaluated; a full
+                     scan is only done when no move is found at all
+        "hybrid"     "dont-look", falling back to a full best-improvement
+                     scan whenever the awake customers have no improving move
+
+    `tabu_attributes` selects what a move makes tabu (see tabu.py): "nodes"
+    (default) forbids moving the nodes it moved, "arcs" forbids recreating
+    the arcs it removed. Arcs are only supported by the scalar evaluation.
+
+    Granular mode (`granular_k` set) restricts reinsertion and inter-swap to
+    moves where a relocated customer gets a candidate arc: one joining it to
+    one of its `granular_k` nearest nodes. With `granular_threshold` = beta,
+    candidate arcs must also be no longer than beta times the average arc of
+    the initial solution (Toth & Vigo, 2003).
+
+    `evaluation` selects how neighborhoods are evaluated: "scalar" loops over
+    the moves one by one, "batch" computes each route's (or route pair's)
+    delta matrix with NumPy (see batch_moves.py). Both select the same moves.
+    NumPy only pays off on long routes, so "batch" keeps the scalar loops
+    for the neighborhoods below BATCH_MIN_SIZE and, with granular lists, for
+    reinsertion and inter-swap.
+
+    `verbose` = False silences the progress messages (used by the
+    multi-process drivers).
+
+    The search stops at the first of these rules that applies (the optional
+    ones are off when None):
+        time_limit              seconds since start_time
+        max_iterations          iterations done
+        stagnation_iterations   iterations since the best cost last improved
+        stagnation_time         seconds since the best cost last improved
+                                (or since start_time)
+        target_cost             best cost <= target_cost
+        stop_event              the event is set, e.g. by
+                                stopping.stop_on_signals on SIGINT/SIGTERM
+    In every case the best solution found so far is returned. The rule that
+    stopped the search is stored in stats.stop_reason.
+
+    Instrumentation is off by default. A SearchStats passed as `stats` gets
+    per-operator evaluation counts and times, neighborhood sizes, selections
+    and cumulative deltas, plus the iteration count and the search time.
+    `trace` (a file path or a callback, see instrumentation.py) receives
+    (iteration, elapsed, current_cost, best_cost, move) after every iteration.
+    `on_improvement` receives (routes, best_cost, elapsed, iteration) each
+    time the best cost improves, `routes` being a copy of the new best
+    solution (see solver.py for a streaming API built on it).
+
+    With an `elite` pool (see elite.py), the local optima visited are offered
+    to it, and so is the final best solution. With `relink_after` = k as
+    well, the search intensifies after k iterations without a new best:
+    it relinks the current solution with the most distant elite solution
+    and continues from the best solution on that path.
+
+    With `checkpoint` set, the full search state (current and best routes,
+    tabu memory, counters and settings) is saved to that file every
+    `checkpoint_interval` seconds and when the search stops. Use
+    resume_local_search to continue from it; `resume` is the loaded
+    checkpoint it passes in.
+    """
+    if evaluation not in ("scalar", "batch"):
+        raise ValueError(f"Unknown evaluation '{evaluation}', expected 'scalar' or 'batch'.")
+    if relink_after is not None and elite is None:
+        raise ValueError("relink_after needs an elite pool.")
+    for op in extra_operators:
+        if op not in EXTRA_OPERATORS:
+            raise ValueError(f"Unknown operator '{op}', expected one of {EXTRA_OPERATORS}.")
+    if exploration not in EXPLORATIONS:
+        raise ValueError(f"Unknown exploration '{exploration}', expected one of {EXPLORATIONS}.")
+    if tabu_attributes not in ("nodes", "arcs"):
+        raise ValueError(f"Unknown tabu_attributes '{tabu_attributes}', expected 'nodes' or 'arcs'.")
+    if tabu_attributes == "arcs" and evaluation == "batch":
+        raise ValueError("Arc tabu attributes need the scalar evaluation.")
+
+    D = I.distance_rows
 
     def evaluate_removal(prev, rem, next):
         return (
-            - I.distance_matrix[prev][rem]
-            - I.distance_matrix[rem][next]
-            + I.distance_matrix[prev][next]
+            - D[prev][rem]
+            - D[rem][next]
+            + D[prev][next]
         )
     
     def evaluate_insertion(prev, ins, next):
         return (
-            - I.distance_matrix[prev][next]
-            + I.distance_matrix[prev][ins]
-            + I.distance_matrix[ins][next]
+            - D[prev][next]
+            + D[prev][ins]
+            + D[ins][next]
         )
     
     def evaluate_2_opt(i, j, prev, next):
         return (
-            - I.distance_matrix[prev][i]
-            - I.distance_matrix[j][next]
-            + I.distance_matrix[prev][j]
-            + I.distance_matrix[i][next]
+            - D[prev][i]
+            - D[j][next]
+            + D[prev][j]
+            + D[i][next]
         )
 
-    def reinsertion(r_1, r_2, sol, TL, capacity_usage, aspiration_cost):
-        route_1 = sol[r_1]
-        route_2 = sol[r_2]
-        l_r1 = len(route_1)
+    # Don't-look bits during a don't-look scan, None otherwise: a move is only
+    # evaluated when a customer it moves, or one it is inserted next to, is
+    # awake. Positions are checked through the customers at the given offsets
+    # around them (the depot never wakes a move).
+    sleeping = None
+
+    def asleep_at(route, p, offsets):
+        l_r = len(route)
+        return all(sleeping[route[(p + o) % l_r]] for o in offsets)
+
+    def awake_positions(route, positions, offsets):
+        return [p for p in positions if not asleep_at(route, p, offsets)]
+
+    # Each neighborhood returns two candidates (delta, i, j): the best
+    # capacity-feasible move and the best one that is also not tabu. Which of
+    # the two is admissible only depends on the aspiration cost (see
+    # `admissible`), so results can be cached while the routes and the tabu
+    # status of their nodes stay the same.
+    def reinsertion(r_1, r_2, state, tabu):
+        route_1 = state.routes[r_1]
+        route_2 = state.routes[r_2]
         l_r2 = len(route_2)
-
-        best_delta = float('inf')
-        best_pos = -1
-        best_destination = -1
+        free_capacity = I.capacity - state.load[r_2]
+        pred = state.pred
+        succ = state.succ
+
+        best = (float('inf'), -1, -1)
+        best_free = best
+        if sleeping is not None:
+            awake_2 = awake_positions(route_2, range(1, l_r2), (-1, 0))
         for r_pos in range(1, len(route_1)):
-            for i_pos in range(1, len(route_2)):
-                prev_r1 = route_1[r_pos-1]
-                next_r1 = route_1[(r_pos+1)%l_r1]
+            v = route_1[r_pos]
+            if I.demands[v] > free_capacity:
+                continue
+            removal = evaluate_removal(pred[v], v, succ[v])
+            v_tabu = tabu[v]
+            if candidates is None:
+                positions = range(1, len(route_2))
+            else:
+                positions = _granular_insertions(candidates[v], state, r_2)
+            if sleeping is not None and sleeping[v]:
+                positions = awake_2 if candidates is None else awake_positions(route_2, positions, (-1, 0))
+            for i_pos in positions:
                 prev_r2 = route_2[i_pos-1]
                 next_r2 = route_2[i_pos%l_r2]
-                delta_cost = (
-                    evaluate_removal(prev_r1, route_1[r_pos], next_r1)
-                    + evaluate_insertion(prev_r2, route_1[r_pos], next_r2)
-                )
+                delta_cost = removal + evaluate_insertion(prev_r2, v, next_r2)
 
-                if ((route_1[r_pos] not in TL and route_2[i_pos] not in TL or delta_cost < aspiration_cost)
-                    and I.demands[route_1[r_pos]] <= I.capacity - capacity_usage[r_2] and delta_cost < best_delta):
-                    best_delta = delta_cost
-                    best_pos = r_pos
-                    best_destination = i_pos
+                if delta_cost < best[0]:
+                    best = (delta_cost, r_pos, i_pos)
+                if (delta_cost < best_free[0] and not (v_tabu or tabu[route_2[i_pos]])
+                        and (tabu_arc is None
+                             or not (tabu_arc(pred[v], succ[v]) or tabu_arc(prev_r2, v) or tabu_arc(v, next_r2)))):
+                    best_free = (delta_cost, r_pos, i_pos)
 
-        # if best_delta < 0:
-        #     print(f"{best_delta} by {best_pos} to {best_destination}")
-        return best_delta, best_pos, best_destination
+        return best, best_free
 
-    def two_opt(r, sol, TL, aspiration_cost):
-        route = sol[r]
+    def two_opt(r, state, tabu):
+        route = state.routes[r]
 
-        best_delta = float('inf')
-        best_i = -1
-        best_j = -1
+        best = (float('inf'), -1, -1)
+        best_free = best
         for i in range(1, len(route)-1):
-            for j in range(i+1, len(route)):
+            positions = range(i+1, len(route))
+            if sleeping is not None and asleep_at(route, i, (-1, 0)):
+                positions = awake_positions(route, positions, (0, 1))
+            for j in positions:
                 if (i==1 and j==len(route)-1):
                     continue
                 prev = i-1
                 next = (j+1)%len(route)
                 delta_cost = evaluate_2_opt(route[i], route[j], route[prev], route[next])
 
-                if (route[i] not in TL and route[j] not in TL or delta_cost < aspiration_cost) and delta_cost < best_delta:
-                    best_delta = delta_cost
-                    best_i = i
-                    best_j = j
+                if delta_cost < best[0]:
+                    best = (delta_cost, i, j)
+                if (delta_cost < best_free[0] and not (tabu[route[i]] or tabu[route[j]])
+                        and (tabu_arc is None
+                             or not (tabu_arc(route[prev], route[j]) or tabu_arc(route[i], route[next])))):
+                    best_free = (delta_cost, i, j)
 
-        # if True or best_delta < 0:
-        #     print(f"{best_delta} {best_i} and {best_j}")
-        return best_delta, best_i, best_j
+        return best, best_free
 
-    def intra_swap(r, sol, TL, aspiration_cost):
-        route = sol[r]
+    def intra_swap(r, state, tabu):
+        route = state.routes[r]
 
-        best_delta = float('inf')
-        best_i = -1
-        best_j = -1
+        best = (float('inf'), -1, -1)
+        best_free = best
         for i in range(1, len(route)-1):
-            for j in range(i+2, len(route)):
+            positions = range(i+2, len(route))
+            if sleeping is not None and asleep_at(route, i, (-1, 0, 1)):
+                positions = awake_positions(route, positions, (-1, 0, 1))
+            for j in positions:
                 prev_i = route[i-1]
                 next_i = route[(i+1)%len(route)]
                 prev_j = route[j-1]
@@ -100,269 +399,854 @@ def local_search(sol: List[List[int]], I: CVRPInstance, start_time: float, time_
                     + evaluate_insertion(prev_i, route[j], next_i)
                 )
 
-                if (route[i] not in TL and route[j] not in TL or delta_cost < aspiration_cost) and delta_cost < best_delta:
-                    best_delta = delta_cost
-                    best_i = i
-                    best_j = j
-
-        # if True or best_delta < 0:
-        #     print(f"{r}:{best_delta} {best_i} and {best_j}")
-        return best_delta, best_i, best_j
-
-    def inter_swap(r_1, r_2, sol, TL, capacity_usage, aspiration_cost):
-        route_1 = sol[r_1]
-        route_2 = sol[r_2]
-        l_r1 = len(route_1)
-        l_r2 = len(route_2)
-
-        best_delta = float('inf')
-        best_pos = -1
-        best_destination = -1
+                if delta_cost < best[0]:
+                    best = (delta_cost, i, j)
+                if (delta_cost < best_free[0] and not (tabu[route[i]] or tabu[route[j]])
+                        and (tabu_arc is None
+                             or not (tabu_arc(prev_i, route[j]) or tabu_arc(route[j], next_i)
+                                     or tabu_arc(prev_j, route[i]) or tabu_arc(route[i], next_j)))):
+                    best_free = (delta_cost, i, j)
+
+        return best, best_free
+
+    def inter_swap(r_1, r_2, state, tabu):
+        route_1 = state.routes[r_1]
+        route_2 = state.routes[r_2]
+        free_1 = I.capacity - state.load[r_1]
+        free_2 = I.capacity - state.load[r_2]
+        pred = state.pred
+        succ = state.succ
+
+        best = (float('inf'), -1, -1)
+        best_free = best
+        if sleeping is not None:
+            awake_2 = awake_positions(route_2, range(1, len(route_2)), (-1, 0, 1))
         for i in range(1, len(route_1)):
-            for j in range(1, len(route_2)):
-                prev_r1 = route_1[i-1]
-                next_r1 = route_1[(i+1)%l_r1]
-                prev_r2 = route_2[j-1]
-                next_r2 = route_2[(j+1)%l_r2]
+            v1 = route_1[i]
+            prev_r1 = pred[v1]
+            next_r1 = succ[v1]
+            if candidates is None:
+                positions = range(1, len(route_2))
+            else:
+                positions = _granular_swaps(candidates[v1], candidates[prev_r1] | candidates[next_r1],
+                                            state, r_2)
+            if sleeping is not None and asleep_at(route_1, i, (-1, 0, 1)):
+                positions = awake_2 if candidates is None else awake_positions(route_2, positions, (-1, 0, 1))
+            for j in positions:
+                v2 = route_2[j]
+                if (I.demands[v1] > free_2 + I.demands[v2]
+                    or I.demands[v2] > free_1 + I.demands[v1]):
+                    continue
+                prev_r2 = pred[v2]
+                next_r2 = succ[v2]
                 delta_cost = (
-                    evaluate_removal(prev_r1, route_1[i], next_r1)
-                    + evaluate_insertion(prev_r2, route_1[i], next_r2)
-                    + evaluate_removal(prev_r2, route_2[j], next_r2)
-                    + evaluate_insertion(prev_r1, route_2[j], next_r1)
+                    evaluate_removal(prev_r1, v1, next_r1)
+                    + evaluate_insertion(prev_r2, v1, next_r2)
+                    + evaluate_removal(prev_r2, v2, next_r2)
+                    + evaluate_insertion(prev_r1, v2, next_r1)
                 )
 
-                if (
-                    (route_1[i] not in TL and route_2[j] not in TL or delta_cost < aspiration_cost)
-                    and I.demands[route_1[i]] <= I.capacity - capacity_usage[r_2] + I.demands[route_2[j]]
-                    and I.demands[route_2[j]] <= I.capacity - capacity_usage[r_1] + I.demands[route_1[i]]
-                    and delta_cost < best_delta
-                ):
-                    best_delta = delta_cost
-                    best_pos = i
-                    best_destination = j
-
-        # if best_delta < 0:
-        #     print(f"{best_delta} by {best_pos} to {best_destination}")
-        return best_delta, best_pos, best_destination
-
-    def break_route(r, sol, TL, aspiration_cost):
-        route = sol[r]
-
-        best_delta = float('inf')
-        best_i = -1
-        best_j = -1
-        for i in range(2, len(route)):
+                if delta_cost < best[0]:
+                    best = (delta_cost, i, j)
+                if (delta_cost < best_free[0] and not (tabu[v1] or tabu[v2])
+                        and (tabu_arc is None
+                             or not (tabu_arc(prev_r1, v2) or tabu_arc(v2, next_r1)
+                                     or tabu_arc(prev_r2, v1) or tabu_arc(v1, next_r2)))):
+                    best_free = (delta_cost, i, j)
+
+        return best, best_free
+
+    def break_route(r, state):
+        route = state.routes[r]
+
+        best = (float('inf'), -1, -1)
+        positions = range(2, len(route))
+        if sleeping is not None:
+            positions = awake_positions(route, positions, (-1, 0))
+        for i in positions:
             prev = route[i-1]
             next = route[i]
             delta_cost = evaluate_insertion(prev, 0, next)
 
-            if delta_cost < best_delta:
-                best_delta = delta_cost
-                best_i = i
-                best_j = i
+            if delta_cost < best[0]:
+                best = (delta_cost, i, i)
+
+        # break-route ignores the tabu memory
+        return best, best
+
+    def two_opt_star(r_1, r_2, state, tabu):
+        # Cutting route 1 after position i and route 2 after position j:
+        # (a, a_next) and (b, b_next) become (a, b_next) and (b, a_next)
+        route_1 = state.routes[r_1]
+        route_2 = state.routes[r_2]
+        l_r1 = len(route_1)
+        l_r2 = len(route_2)
+        prefix_1 = state.prefix_load[r_1]
+        prefix_2 = state.prefix_load[r_2]
+        load_1 = state.load[r_1]
+        load_2 = state.load[r_2]
+
+        best = (float('inf'), -1, -1)
+        best_free = best
+        if sleeping is not None:
+            awake_2 = awake_positions(route_2, range(l_r2), (0, 1))
+        for i in range(l_r1):
+            a = route_1[i]
+            a_next = route_1[i+1] if i+1 < l_r1 else 0
+            head_1 = prefix_1[i]
+            positions = range(l_r2)
+            if sleeping is not None and asleep_at(route_1, i, (0, 1)):
+                positions = awake_2
+            for j in positions:
+                if (i == 0 and j == 0) or (i == l_r1-1 and j == l_r2-1):
+                    continue  # the routes would only trade places
+                head_2 = prefix_2[j]
+                if head_1 + load_2 - head_2 > I.capacity or head_2 + load_1 - head_1 > I.capacity:
+                    continue
+                b = route_2[j]
+                b_next = route_2[j+1] if j+1 < l_r2 else 0
+                if candidates is not None and not (b_next in candidates[a] or a_next in candidates[b]):
+                    continue
+                delta_cost = D[a][b_next] + D[b][a_next] - D[a][a_next] - D[b][b_next]
 
-        # if True or best_delta < 0:
-        #     print(f"{best_delta} {best_i} and {best_j}")
-        return best_delta, best_i, best_j
+                if delta_cost < best[0]:
+                    best = (delta_cost, i, j)
+                if (delta_cost < best_free[0] and not (tabu[a_next] or tabu[b_next])
+                        and (tabu_arc is None or not (tabu_arc(a, b_next) or tabu_arc(b, a_next)))):
+                    best_free = (delta_cost, i, j)
+
+        return best, best_free
+
+    def or_opt(r_1, r_2, state, tabu):
+        # Moves are (delta, i, j, k): route 1's segment i .. i+|k|-1 goes to
+        # position j of route 2, reversed when k < 0
+        route_1 = state.routes[r_1]
+        route_2 = state.routes[r_2]
+        l_r1 = len(route_1)
+        l_r2 = len(route_2)
+        free_capacity = I.capacity - state.load[r_2]
+
+        best = (float('inf'), -1, -1, 0)
+        best_free = best
+        if sleeping is not None:
+            awake_2 = awake_positions(route_2, range(1, l_r2 + 1), (-1, 0))
+        for k in OR_OPT_LENGTHS:
+            for i in range(1, l_r1 - k + 1):
+                e = i + k - 1
+                if state.segment_load(r_1, i, e) > free_capacity:
+                    continue
+                first = route_1[i]
+                last = route_1[e]
+                prev = route_1[i-1]
+                next = route_1[e+1] if e+1 < l_r1 else 0
+                removal = D[prev][next] - D[prev][first] - D[last][next]
+                segment_tabu = tabu[first] or tabu[last]
+                positions = range(1, l_r2 + 1)
+                if sleeping is not None and asleep_at(route_1, i, (-1, 0, k-1, k)):
+                    positions = awake_2
+                for j in positions:
+                    a = route_2[j-1]
+                    b = route_2[j] if j < l_r2 else 0
+                    base = removal - D[a][b]
+                    for head, tail, orientation in ((first, last, k), (last, first, -k)):
+                        if candidates is not None and not (head in candidates[a] or tail in candidates[b]):
+                            continue
+                        delta_cost = base + D[a][head] + D[tail][b]
+
+                        if delta_cost < best[0]:
+                            best = (delta_cost, i, j, orientation)
+                        if (delta_cost < best_free[0] and not (segment_tabu or tabu[b])
+                                and (tabu_arc is None
+                                     or not (tabu_arc(prev, next) or tabu_arc(a, head) or tabu_arc(tail, b)))):
+                            best_free = (delta_cost, i, j, orientation)
+
+        return best, best_free
+
+    if 'swap*' in extra_operators:
+        # Polar angle of every customer around the depot
+        x_0, y_0 = I.coords[0]
+        angle = [atan2(y - y_0, x - x_0) for x, y in I.coords]
+
+    def top_insertions(v, route):
+        # The SWAP_STAR_POSITIONS cheapest (cost, position) insertions of v
+        # in route, position l_r being after its last customer
+        l_r = len(route)
+        return heapq.nsmallest(SWAP_STAR_POSITIONS, (
+            (D[route[p-1]][v] + D[v][route[p % l_r]] - D[route[p-1]][route[p % l_r]], p)
+            for p in range(1, l_r + 1)))
+
+    def swap_star(r_1, r_2, state, tabu):
+        # SWAP* (Vidal, 2022): u = route_1[i] and v = route_2[j] trade routes,
+        # each one inserted at position p / q of the other route. p == i
+        # (q == j) puts v in place of u, any other position comes from the
+        # top insertions of v in route 1 that do not touch u. Moves are
+        # (delta, i, j, (p, q)).
+        route_1 = state.routes[r_1]
+        route_2 = state.routes[r_2]
+        free_1 = I.capacity - state.load[r_1]
+        free_2 = I.capacity - state.load[r_2]
+        pred = state.pred
+        succ = state.succ
+
+        best = (float('inf'), -1, -1, (-1, -1))
+        best_free = best
+        if not _sectors_overlap(_polar_sector([angle[v] for v in route_1[1:]]),
+                                _polar_sector([angle[v] for v in route_2[1:]])):
+            return best, best_free
+
+        top_1 = [None] + [top_insertions(v, route_1) for v in route_2[1:]]
+        top_2 = [None] + [top_insertions(u, route_2) for u in route_1[1:]]
+
+        def insertion(top, prev, w, next, i):
+            # Cheapest insertion of w in a route whose position i is removed
+            cost = evaluate_insertion(prev, w, next)
+            p = i
+            for top_cost, top_p in top:
+                if top_p != i and top_p != i + 1:
+                    if top_cost < cost:
+                        cost = top_cost
+                        p = top_p
+                    break
+            return cost, p
+
+        if sleeping is not None:
+            awake_2 = awake_positions(route_2, range(1, len(route_2)), (-1, 0, 1))
+        for i in range(1, len(route_1)):
+            u = route_1[i]
+            prev_u = pred[u]
+            next_u = succ[u]
+            removal_u = evaluate_removal(prev_u, u, next_u)
+            positions = range(1, len(route_2))
+            if sleeping is not None and asleep_at(route_1, i, (-1, 0, 1)):
+                positions = awake_2
+            for j in positions:
+                v = route_2[j]
+                if (I.demands[u] > free_2 + I.demands[v]
+                    or I.demands[v] > free_1 + I.demands[u]):
+                    continue
+                prev_v = pred[v]
+                next_v = succ[v]
+                cost_v, p = insertion(top_1[j], prev_u, v, next_u, i)
+                cost_u, q = insertion(top_2[i], prev_v, u, next_v, j)
+                delta_cost = removal_u + evaluate_removal(prev_v, v, next_v) + cost_v + cost_u
+
+                if delta_cost < best[0]:
+                    best = (delta_cost, i, j, (p, q))
+                if (delta_cost < best_free[0] and not (tabu[u] or tabu[v])
+                        and (tabu_arc is None
+                             or not any(tabu_arc(a, b) for a, b in
+                                        swap_star_arcs(route_1, i, p, v) + swap_star_arcs(route_2, j, q, u)))):
+                    best_free = (delta_cost, i, j, (p, q))
+
+        return best, best_free
+
+    def swap_star_arcs(route, i, p, w):
+        # Arcs created in route when its position i is removed and w is
+        # inserted at position p
+        l_r = len(route)
+        if p == i:
+            return [(route[i-1], w), (w, route[(i+1) % l_r])]
+        return [(route[i-1], route[(i+1) % l_r]), (route[p-1], w), (w, route[p % l_r])]
+
+    def admissible(entry, aspiration_cost):
+        # A tabu move is admissible when it beats the aspiration cost. If the
+        # overall best does not, no tabu move does, and the best non-tabu move
+        # is the answer.
+        best, best_free = entry
+        return best if best[0] < aspiration_cost else best_free
+
+    def tabu_slots(move, r_1, i, r_2, j, k):
+        # What the selected move makes tabu, in the two slots it fills:
+        # the nodes it moves, or the arcs it removes
+        route = sol[r_1]
+        l_r = len(route)
+        if move == '2-opt*':
+            # The first customers of the exchanged tails / the cut arcs
+            route_2 = sol[r_2]
+            a_next = route[i+1] if i+1 < l_r else 0
+            b_next = route_2[j+1] if j+1 < len(route_2) else 0
+            if tabu_arc is None:
+                return [a_next] if a_next else [], [b_next] if b_next else []
+            return [arc(route[i], a_next), arc(route_2[j], b_next)], []
+        if move == 'or-opt':
+            route_2 = sol[r_2]
+            e = i + abs(k) - 1
+            if tabu_arc is None:
+                return [route[i]], [route[e]]
+            return [arc(route[i-1], route[i]), arc(route[e], route[(e+1)%l_r]),
+                    arc(route_2[j-1], route_2[j%len(route_2)])], []
+        if move == 'swap*':
+            route_2 = sol[r_2]
+            if tabu_arc is None:
+                return [route[i]], [route_2[j]]
+            p, q = k
+            removed = [arc(route[i-1], route[i]), arc(route[i], route[(i+1) % l_r]),
+                       arc(route_2[j-1], route_2[j]), arc(route_2[j], route_2[(j+1) % len(route_2)])]
+            if p != i:
+                removed.append(arc(route[p-1], route[p % l_r]))
+            if q != j:
+                removed.append(arc(route_2[q-1], route_2[q % len(route_2)]))
+            return removed, []
+        if tabu_arc is None:
+            if move == 'reinsert':
+                return [route[i]], []
+            if move == 'break-route':
+                return [route[i]], [route[-1]]
+            return [route[i]], [sol[r_2][j] if move == 'inter-swap' else route[j]]
+        removed = [arc(route[i-1], route[i])]
+        if move == 'reinsert':
+            route_2 = sol[r_2]
+            removed += [arc(route[i], route[(i+1)%l_r]), arc(route_2[j-1], route_2[j%len(route_2)])]
+        elif move == '2-opt':
+            removed.append(arc(route[j], route[(j+1)%l_r]))
+        elif move == 'intra-swap':
+            removed += [arc(route[i], route[i+1]), arc(route[j-1], route[j]), arc(route[j], route[(j+1)%l_r])]
+        elif move == 'inter-swap':
+            route_2 = sol[r_2]
+            removed += [arc(route[i], route[(i+1)%l_r]), arc(route_2[j-1], route_2[j]),
+                        arc(route_2[j], route_2[(j+1)%len(route_2)])]
+        return removed, []
 
     tau = ceil(sqrt(I.nnodes)) * 2
 
-    TL = [-1 for i in range(tau)]
+    # Tabu status: tabu[v] for the nodes mode, tabu_arc(a, b) for the arcs
+    # mode (the node flags then stay False)
+    memory = TabuMemory(tau)
+    tabu = [False] * I.nnodes
+    tabu_arc = None
+    if tabu_attributes == "arcs":
+        def tabu_arc(a, b):
+            return arc(a, b) in memory
 
-    capacity_usage = [0 for i in range(len(sol))]
-    for i, route in enumerate(sol):
-        for node in route[1:]:
-            capacity_usage[i] += I.demands[node]
+    state = SolutionState(sol, I)
+    sol = state.routes
 
     stop = False
+    stop_reason = None
     iter = 0
 
-    current_cost = 0
-    
-    for i, route in enumerate(sol):
-        for v in range(len(route)):
-            current_cost += I.distance_matrix[route[v]][route[(v+1)%len(route)]]
+    current_cost = state.total_cost()
+
+    candidates = None
+    granular_limit = float('inf')
+    if granular_k is not None:
+        # A resumed search keeps the limit derived from its initial solution
+        if resume is not None:
+            granular_limit = resume["granular_limit"]
+        elif granular_threshold is not None:
+            granular_limit = granular_threshold * current_cost / sum(len(route) for route in sol)
+        candidates = [set() for _ in range(I.nnodes)]
+        for u, near in enumerate(I.nearest_neighbors(granular_k).tolist()):
+            for v in near:
+                if D[u][v] <= granular_limit:
+                    candidates[u].add(v)
+                    candidates[v].add(u)
+
+    # The best solution is not copied when it improves: it is the current one
+    # with the moves journaled since then undone. It is only materialized if
+    # the journal grows past max_journal, and at the end of the run.
+    state.journal = []
+    best_sol = None
+    max_journal = 10 * I.nnodes
+
+    if evaluation == "batch":
+        W = I.distance_matrix.astype(np.float64 if I.distance_matrix.dtype.kind == 'f' else np.int64)
+        demand_array = np.asarray(I.demands)
+        tabu_array = np.zeros(I.nnodes, dtype=bool)
+
+        # The don't-look bits of a don't-look scan, as an array
+        sleeping_array = None
+
+        # NumPy only pays off on large neighborhoods (BATCH_MIN_SIZE): the
+        # smaller ones keep the scalar loops, which select the same moves. So
+        # do reinsertion and inter-swap with granular lists, whose scalar
+        # loops only visit the candidate positions.
+        scalar_reinsertion, scalar_two_opt, scalar_intra_swap, scalar_inter_swap, scalar_break_route = (
+            reinsertion, two_opt, intra_swap, inter_swap, break_route)
+
+        def reinsertion(r_1, r_2, state, tabu):
+            route_1 = state.routes[r_1]
+            positions = len(state.routes[r_2]) - 1
+            if candidates is not None or (len(route_1) - 1) * positions < BATCH_MIN_SIZE['reinsert']:
+                return scalar_reinsertion(r_1, r_2, state, tabu)
+            free_capacity = I.capacity - state.load[r_2]
+            if sum(I.demands[v] <= free_capacity for v in route_1[1:]) * positions < BATCH_MIN_SIZE['reinsert']:
+                return scalar_reinsertion(r_1, r_2, state, tabu)
+            return batch_moves.reinsertion(W, demand_array, I.capacity, state, r_1, r_2, tabu_array,
+                                           asleep=sleeping_array)
+
+        def two_opt(r, state, tabu):
+            if len(state.routes[r]) - 1 < BATCH_MIN_SIZE['2-opt']:
+                return scalar_two_opt(r, state, tabu)
+            return batch_moves.two_opt(W, state, r, tabu_array, sleeping_array)
+
+        def intra_swap(r, state, tabu):
+            if len(state.routes[r]) - 1 < BATCH_MIN_SIZE['intra-swap']:
+                return scalar_intra_swap(r, state, tabu)
+            return batch_moves.intra_swap(W, state, r, tabu_array, sleeping_array)
+
+        def inter_swap(r_1, r_2, state, tabu):
+            if (candidates is not None
+                    or (len(state.routes[r_1]) - 1) * (len(state.routes[r_2]) - 1) < BATCH_MIN_SIZE['inter-swap']):
+                return scalar_inter_swap(r_1, r_2, state, tabu)
+            return batch_moves.inter_swap(W, demand_array, I.capacity, state, r_1, r_2, tabu_array,
+                                          asleep=sleeping_array)
+
+        def break_route(r, state):
+            if len(state.routes[r]) - 1 < BATCH_MIN_SIZE['break-route']:
+                return scalar_break_route(r, state)
+            return batch_moves.break_route(W, state, r, sleeping_array)
+
+    if stats is not None:
+        # Moves per evaluation: the (i, j) pairs of each neighborhood's loops
+        # (before granular filtering)
+        def pair_size(r_1, r_2, state, tabu):
+            return (len(state.routes[r_1]) - 1) * (len(state.routes[r_2]) - 1)
+
+        def two_opt_size(r, state, tabu):
+            l_r = len(state.routes[r])
+            return max(0, (l_r - 1) * (l_r - 2) // 2 - 1)
+
+        def intra_swap_size(r, state, tabu):
+            l_r = len(state.routes[r])
+            return max(0, (l_r - 2) * (l_r - 3) // 2)
+
+        def break_route_size(r, state):
+            return max(0, len(state.routes[r]) - 2)
+
+        def tails_size(r_1, r_2, state, tabu):
+            return len(state.routes[r_1]) * len(state.routes[r_2]) - 2
+
+        def or_opt_size(r_1, r_2, state, tabu):
+            l_r1 = len(state.routes[r_1])
+            return sum(2 * max(0, l_r1 - k) for k in OR_OPT_LENGTHS) * len(state.routes[r_2])
+
+        reinsertion = stats.timed('reinsert', reinsertion, pair_size)
+        two_opt = stats.timed('2-opt', two_opt, two_opt_size)
+        intra_swap = stats.timed('intra-swap', intra_swap, intra_swap_size)
+        inter_swap = stats.timed('inter-swap', inter_swap, pair_size)
+        break_route = stats.timed('break-route', break_route, break_route_size)
+        two_opt_star = stats.timed('2-opt*', two_opt_star, tails_size)
+        or_opt = stats.timed('or-opt', or_opt, or_opt_size)
+        swap_star = stats.timed('swap*', swap_star, pair_size)
+
+    # Neighborhoods in evaluation order, as (name, evaluation, routes) where
+    # routes is 'single' (each route), 'ordered' (pairs r1 != r2) or
+    # 'unordered' (pairs r1 < r2). Break-route ignores the tabu memory.
+    extra_neighborhoods = {'2-opt*': (two_opt_star, 'unordered'), 'or-opt': (or_opt, 'ordered'),
+                           'swap*': (swap_star, 'unordered')}
+    neighborhoods = [('reinsert', reinsertion, 'ordered'), ('2-opt', two_opt, 'single'),
+                     ('intra-swap', intra_swap, 'single'), ('inter-swap', inter_swap, 'unordered')]
+    neighborhoods += [(op, *extra_neighborhoods[op]) for op in EXTRA_OPERATORS if op in extra_operators]
+    neighborhoods.append(('break-route', lambda r, state, tabu: break_route(r, state), 'single'))
+
+    def scan(selected, neighborhoods, order, shuffled, aspiration_cost, awake, stop_below):
+        # Best admissible move of `neighborhoods` over the routes in `order`
+        # that beats `selected` = (delta, type, r_1, r_2, move), returned as
+        # soon as its delta is below `stop_below`. With don't-look bits
+        # (`sleeping` set), only the routes with `awake` customers (one of
+        # them for pairs) are visited, and their moves come from the cache of
+        # the moves of awake customers.
+        n = len(sol)
+        awake_order = order if awake is None else [r for r in order if awake[r]]
+        tables = cache if awake is None else cache.awake
+        for name, evaluate, routes in neighborhoods:
+            if routes == 'single':
+                table = tables.single[name]
+                for r in awake_order:
+                    if table[r] is None:
+                        table[r] = evaluate(r, state, tabu)
+                    move = admissible(table[r], aspiration_cost)
+                    if move[0] < selected[0]:
+                        selected = (move[0], name, r, -1, move)
+                        if selected[0] < stop_below:
+                            return selected
+            else:
+                table = tables.pair[name]
+                symmetric = routes == 'unordered'
+                for r1 in order:
+                    row = table[r1]
+                    if symmetric and not shuffled:
+                        targets = range(r1 + 1, n)
+                    elif awake is None or awake[r1]:
+                        targets = order
+                    else:
+                        targets = awake_order
+                    for r2 in targets:
+                        if r1 == r2 or (symmetric and r1 > r2):
+                            continue
+                        if row[r2] is None:
+                            row[r2] = evaluate(r1, r2, state, tabu)
+                        move = admissible(row[r2], aspiration_cost)
+                        if move[0] < selected[0]:
+                            selected = (move[0], name, r1, r2, move)
+                            if selected[0] < stop_below:
+                                return selected
+        return selected
+
+    # First improvement: any improving move ends the scan
+    stop_below = float('-inf') if exploration == "best" else 0
+    rng = random.Random(seed) if exploration != "best" else None
+    # Don't-look bits of the customers (the depot always sleeps)
+    asleep = [True] + [False] * (I.nnodes - 1) if exploration in ("dont-look", "hybrid") else None
 
-    sol = deepcopy(sol)
-    best_sol = deepcopy(sol)
     best_cost = current_cost
     best_time = 0
+    best_iteration = 0
 
-    print(f"Initial cost: {current_cost}")
+    if verbose and resume is None:
+        print(f"Initial cost: {current_cost}")
 
     patience = 0
     force_break = False
 
-    while not stop:
-        sel_r1 = -1
-        sel_r2 = -1
-        sel_delta = float('inf')
-        sel_i = -1
-        sel_j = -1
-        sel_type = None
-
-        aspiration_cost = best_cost - current_cost
-
-        if not force_break:
-            # Evaluate reinsertions
-            for r1 in range(len(sol)):
-                for r2 in range(len(sol)):
-                    if  r1 != r2:
-                        delta, pos, dest =  reinsertion(r1, r2, sol, TL, capacity_usage, aspiration_cost)
-                        if delta < sel_delta:
-                            sel_r1 = r1
-                            sel_r2 = r2
-                            sel_delta = delta
-                            sel_i = pos
-                            sel_j = dest
-                            sel_type = 'reinsert'
-
-            # # Evaluate 2-opt
-            for r in range(len(sol)):
-                delta, i, j = two_opt(r, sol, TL, aspiration_cost)
-                if delta < sel_delta:
-                    sel_r1 = r
-                    sel_r2 = -1
-                    sel_delta = delta
-                    sel_i = i
-                    sel_j = j
-                    sel_type = '2-opt'
-
-            # # Evaluate intra-swap
-            for r in range(len(sol)):
-                delta, i, j = intra_swap(r, sol, TL, aspiration_cost)
-                if delta < sel_delta:
-                    sel_r1 = r
-                    sel_r2 = -1
-                    sel_delta = delta
-                    sel_i = i
-                    sel_j = j
-                    sel_type = 'intra-swap'
-
-            # # Evaluate inter-swap
-            for i in range(len(sol)):
-                for j in range(i+1, len(sol)):
-                    delta, pos, dest =  inter_swap(i, j, sol, TL, capacity_usage, aspiration_cost)
-                    if delta < sel_delta:
-                        sel_r1 = i
-                        sel_r2 = j
-                        sel_delta = delta
-                        sel_i = pos
-                        sel_j = dest
-                        sel_type = 'inter-swap'
-
-        # # Evaluate break-route
-        for r in range(len(sol)):
-            delta, i, j = break_route(r, sol, TL, aspiration_cost)
-            if delta < sel_delta:
-                sel_r1 = r
-                sel_r2 = -1
-                sel_delta = delta
-                sel_i = i
-                sel_j = j
-                sel_type = 'break-route'
-
-        if sel_type == 'reinsert':
-            v1 = sol[sel_r1][sel_i]
-
-            del sol[sel_r1][sel_i]
-            capacity_usage[sel_r1] -= I.demands[v1]
-
-            sol[sel_r2].insert(sel_j, v1)
-            capacity_usage[sel_r2] += I.demands[v1]
-
-            if len(sol[sel_r1]) == 1:
-                del sol[sel_r1]
-                del capacity_usage[sel_r1]
-
-            # print(f"{sel_r1}: {v1} {sel_i}, {sel_r2}: {v1} {sel_j}, delta: {sel_delta}")
-
-            TL = TL[2:] + [v1, -1]
-
-        elif sel_type == '2-opt':
-            v1 = sol[sel_r1][sel_i]
-            v2 = sol[sel_r1][sel_j]
-
-            sol[sel_r1] = sol[sel_r1][:sel_i] + sol[sel_r1][sel_i:sel_j+1][::-1] + sol[sel_r1][sel_j+1:]
-
-            # print(f"{sel_r1}: {sel_i} {sel_j}, delta: {sel_delta}")
-
-            TL = TL[2:] + [v1, v2]
-
-        elif sel_type == 'intra-swap':
-            v1 = sol[sel_r1][sel_i]
-            v2 = sol[sel_r1][sel_j]
-
-            sol[sel_r1][sel_i] = v2
-            sol[sel_r1][sel_j] = v1
-
-            # print(f"{sel_r1}: {sel_i} {sel_j}, delta: {sel_delta}")
-
-            TL = TL[2:] + [v1, v2]
-
-        elif sel_type == 'inter-swap':
-            v1 = sol[sel_r1][sel_i]
-            v2 = sol[sel_r2][sel_j]
-
-            sol[sel_r1][sel_i] = v2
-            sol[sel_r2][sel_j] = v1
-
-            capacity_usage[sel_r1] += I.demands[v2] - I.demands[v1] 
-            capacity_usage[sel_r2] += I.demands[v1] - I.demands[v2]
-
-            # print(f"{sel_r1}: {sel_i}, {sel_r2}:{sel_j}, delta: {sel_delta}")
-
-            TL = TL[2:] + [v1, v2]
-
-        elif sel_type == 'break-route':
-            sol.append([0] + sol[sel_r1][sel_i:])
-            sol[sel_r1] = sol[sel_r1][:sel_i]
-
-            new_capacity = 0
-            for node in sol[-1][1:]:
-                new_capacity += I.demands[node]
-            
-            capacity_usage.append(new_capacity)
-            capacity_usage[sel_r1] -= new_capacity
-
-            # print(f"{sel_r1}: {sel_i}, delta: {sel_delta}")
-
-            TL = TL[2:] + [sol[-1][1], sol[-1][-1]]
-            
-        else:
-            print("No valid moviments found. Resetting Tabu List")
-            TL = [-1 for i in range(tau)]
-            sel_delta = 0
-
-        current_cost += sel_delta
-        if current_cost < best_cost:
-            best_sol = deepcopy(sol)
-            best_cost = current_cost
-            best_time = perf_counter() - start_time
-            patience = 0
-
-            if tau_reduction and len(TL) == tau:
-                TL = TL[tau//2:]
-
-        if force_break:
-            force_break = False
-
-        if patience > tau and len(TL) < tau:
-            TL = [-1 for i in range(tau - len(TL))] + TL
-
-        if periodic_break and patience > 1000:
-            force_break = True
-            patience = 0
-
-        # print(TL)
-
-        iter += 1
-        patience += 1
-        stop = True if perf_counter() - start_time >= time_limit else stop
-
-    # print(capacity_usage)
+    if resume is not None:
+        # Continue a checkpointed search where it stopped: `sol` holds its
+        # current routes and the move cache is simply rebuilt
+        memory = TabuMemory.from_dict(resume["tabu"])
+        iter = resume["iteration"]
+        patience = resume["patience"]
+        force_break = resume["force_break"]
+        current_cost = resume["current_cost"]
+        best_cost = resume["best_cost"]
+        best_time = resume["best_time"]
+        best_iteration = resume["best_iteration"]
+        best_sol = resume["best_routes"]
+        state.journal = None
+        if rng is not None and resume.get("rng") is not None:
+            version, internal, gauss = resume["rng"]
+            rng.setstate((version, tuple(internal), gauss))
+        if asleep is not None and resume.get("asleep") is not None:
+            asleep = resume["asleep"]
+        if verbose:
+            print(f"Resumed at iteration {iter}, current cost {current_cost}, best cost {best_cost}")
+
+    def write_checkpoint(elapsed):
+        save_checkpoint(checkpoint, {
+            "nnodes": I.nnodes,
+            "capacity": I.capacity,
+            "routes": sol,
+            "best_routes": best_sol if state.journal is None else undo_moves(state.copy_routes(), state.journal),
+            "tabu": memory.to_dict(),
+            "iteration": iter,
+            "patience": patience,
+            "force_break": force_break,
+            "current_cost": current_cost,
+            "best_cost": best_cost,
+            "best_time": best_time,
+            "best_iteration": best_iteration,
+            "elapsed": elapsed,
+            "granular_limit": granular_limit,
+            "rng": rng.getstate() if rng is not None else None,
+            "asleep": asleep,
+            "last_delta": last_delta,
+            "last_relink": last_relink,
+            "elite": elite.to_dict() if elite is not None else None,
+            "settings": {
+                "time_limit": time_limit,
+                "periodic_break": periodic_break,
+                "tau_reduction": tau_reduction,
+                "move_cache": move_cache,
+                "granular_k": granular_k,
+                "granular_threshold": granular_threshold,
+                "evaluation": evaluation,
+                "tabu_attributes": tabu_attributes,
+                "extra_operators": list(extra_operators),
+                "exploration": exploration,
+                "seed": seed,
+                "max_iterations": max_iterations,
+                "stagnation_iterations": stagnation_iterations,
+                "stagnation_time": stagnation_time,
+                "target_cost": target_cost,
+                "relink_after": relink_after,
+                "checkpoint_interval": checkpoint_interval,
+            },
+        })
+
+    last_checkpoint = resume["elapsed"] if resume is not None else 0
+    last_delta = resume.get("last_delta", 0) if resume is not None else 0
+    last_relink = resume.get("last_relink", 0) if resume is not None else 0
+    cache = _MoveCache(len(sol), extra_operators, asleep is not None)
+    # A restored tabu memory is picked up as a change by the first iteration
+    search_start = perf_counter() if stats is not None else None
+
+    emit = open_trace(trace)
+    try:
+        while not stop:
+            sel_i = -1
+            sel_j = -1
+            sel_k = 0
+
+            aspiration_cost = best_cost - current_cost
+
+            # Routes holding a node (or an end of an arc) whose tabu status
+            # changed since the last iteration have stale cached moves
+            changed = memory.changes()
+            if tabu_arc is None:
+                for v in changed:
+                    tabu[v] = v in memory
+                touched = changed
+            else:
+                touched = {v for a in changed for v in a}
+            if not move_cache:
+                cache.reset(len(sol))
+            else:
+                for v in touched:
+                    if v > 0:
+                        cache.invalidate(state.route_of[v])
+            if evaluation == "batch":
+                for v in changed:
+                    tabu_array[v] = tabu[v]
+
+            active = neighborhoods if not force_break else neighborhoods[-1:]
+            if exploration == "best":
+                order = range(len(sol))
+            else:
+                order = list(range(len(sol)))
+                rng.shuffle(order)
+                active = rng.sample(active, len(active))
+            awake = None
+            if asleep is not None:
+                awake = [not all(asleep[v] for v in route[1:]) for route in sol]
+                restricted = any(asleep[1:])
+                sleeping = asleep
+                if evaluation == "batch":
+                    sleeping_array = np.array(asleep)
+
+            selected = scan((float('inf'), None, -1, -1, None), active, order, exploration != "best",
+                            aspiration_cost, awake, stop_below)
+            if awake is not None:
+                sleeping = sleeping_array = None
+                if selected[0] >= 0:
+                    # No improving move of the awake customers: they go to sleep
+                    for r, route in enumerate(sol):
+                        if awake[r]:
+                            for v in route[1:]:
+                                asleep[v] = True
+                            cache.awake.invalidate(r)
+                    if restricted and (exploration == "hybrid" or selected[1] is None):
+                        selected = scan(selected, active, order, True, aspiration_cost, None, float('-inf'))
+
+            sel_delta, sel_type, sel_r1, sel_r2, move = selected
+            if sel_type is not None:
+                sel_i = move[1]
+                sel_j = move[2]
+                if len(move) > 3:
+                    sel_k = move[3]
+
+            if elite is not None and sel_delta >= 0 and last_delta < 0 and elite.admits(current_cost):
+                # No improving move after an improving one: a local optimum
+                elite.add(state.copy_routes(), current_cost)
+
+            if sel_type is not None:
+                slots = tabu_slots(sel_type, sel_r1, sel_i, sel_r2, sel_j, sel_k)
+                if asleep is not None:
+                    # Customers of the changed routes, with their neighbors
+                    around = [(v, state.pred[v], state.succ[v])
+                              for r in (sel_r1, sel_r2) if r >= 0 for v in sol[r][1:]]
+
+            if sel_type == 'reinsert':
+                cache.invalidate(sel_r1)
+                cache.invalidate(sel_r2)
+
+                if state.relocate(sel_r1, sel_i, sel_r2, sel_j):
+                    cache.remove(sel_r1)
+
+                # print(f"{sel_r1}: {sel_i}, {sel_r2}: {sel_j}, delta: {sel_delta}")
+
+            elif sel_type == '2-opt':
+                state.reverse(sel_r1, sel_i, sel_j)
+                cache.invalidate(sel_r1)
+
+                # print(f"{sel_r1}: {sel_i} {sel_j}, delta: {sel_delta}")
+
+            elif sel_type == 'intra-swap':
+                state.swap(sel_r1, sel_i, sel_r1, sel_j)
+                cache.invalidate(sel_r1)
+
+                # print(f"{sel_r1}: {sel_i} {sel_j}, delta: {sel_delta}")
+
+            elif sel_type == 'inter-swap':
+                state.swap(sel_r1, sel_i, sel_r2, sel_j)
+                cache.invalidate(sel_r1)
+                cache.invalidate(sel_r2)
+
+                # print(f"{sel_r1}: {sel_i}, {sel_r2}:{sel_j}, delta: {sel_delta}")
+
+            elif sel_type == '2-opt*':
+                cache.invalidate(sel_r1)
+                cache.invalidate(sel_r2)
+
+                deleted = state.exchange_tails(sel_r1, sel_i, sel_r2, sel_j)
+                if deleted >= 0:
+                    cache.remove(deleted)
+
+            elif sel_type == 'or-opt':
+                cache.invalidate(sel_r1)
+                cache.invalidate(sel_r2)
+
+                if state.move_segment(sel_r1, sel_i, abs(sel_k), sel_r2, sel_j, sel_k < 0):
+                    cache.remove(sel_r1)
+
+            elif sel_type == 'swap*':
+                cache.invalidate(sel_r1)
+                cache.invalidate(sel_r2)
+
+                state.swap_star(sel_r1, sel_i, sel_k[0], sel_r2, sel_j, sel_k[1])
+
+            elif sel_type == 'break-route':
+                state.split(sel_r1, sel_i)
+                cache.invalidate(sel_r1)
+                cache.append()
+
+                # print(f"{sel_r1}: {sel_i}, delta: {sel_delta}")
+
+            else:
+                if verbose:
+                    print("No valid moviments found. Resetting Tabu List")
+                memory.clear(tau)
+                sel_delta = 0
+
+            if sel_type is not None:
+                memory.push(*slots)
+                if asleep is not None:
+                    for v, prev, next in around:
+                        if state.pred[v] != prev or state.succ[v] != next:
+                            asleep[v] = False
+
+            current_cost += sel_delta
+            last_delta = sel_delta
+            if current_cost < best_cost:
+                state.journal = []
+                best_sol = None
+                best_cost = current_cost
+                best_time = perf_counter() - start_time
+                best_iteration = iter + 1
+                patience = 0
+
+                if tau_reduction and len(memory) == tau:
+                    memory.shrink(tau//2)
+
+                if on_improvement is not None:
+                    on_improvement(state.copy_routes(), best_cost, best_time, best_iteration)
+
+            elif state.journal is not None and len(state.journal) > max_journal:
+                best_sol = undo_moves(state.copy_routes(), state.journal)
+                state.journal = None
+
+            if stats is not None:
+                stats.record(sel_type, sel_delta)
+            if emit is not None:
+                emit(iter, perf_counter() - start_time, current_cost, best_cost, sel_type)
+
+            if force_break:
+                force_break = False
+
+            if patience > tau and len(memory) < tau:
+                memory.grow(tau)
+
+            if periodic_break and patience > 1000:
+                force_break = True
+                patience = 0
+
+
+            iter += 1
+            patience += 1
+
+            if relink_after is not None and iter - max(best_iteration, last_relink) >= relink_after:
+                # Intensification: continue from the best solution on the path
+                # to an elite solution
+                last_relink = iter
+                guide = elite.guide(sol)
+                relinked = path_relinking(I, sol, guide.routes) if guide is not None else None
+                if relinked is not None:
+                    if state.journal is not None:
+                        best_sol = undo_moves(state.copy_routes(), state.journal)
+                    state = SolutionState(relinked[0], I)
+                    sol = state.routes
+                    current_cost = relinked[1]
+                    last_delta = 0
+                    cache.reset(len(sol))
+                    if asleep is not None:
+                        asleep = [True] + [False] * (I.nnodes - 1)
+                    if current_cost < best_cost:
+                        state.journal = []
+                        best_sol = None
+                        best_cost = current_cost
+                        best_time = perf_counter() - start_time
+                        best_iteration = iter
+                        if on_improvement is not None:
+                            on_improvement(state.copy_routes(), best_cost, best_time, best_iteration)
+
+            elapsed = perf_counter() - start_time
+            if elapsed >= time_limit:
+                stop_reason = "time limit"
+            elif max_iterations is not None and iter >= max_iterations:
+                stop_reason = "iteration budget"
+            elif stagnation_iterations is not None and iter - best_iteration >= stagnation_iterations:
+                stop_reason = "stagnation (iterations)"
+            elif stagnation_time is not None and elapsed - best_time >= stagnation_time:
+                stop_reason = "stagnation (time)"
+            elif target_cost is not None and best_cost <= target_cost:
+                stop_reason = "target cost"
+            elif stop_event is not None and stop_event.is_set():
+                stop_reason = "stop request"
+            stop = stop_reason is not None
+
+            if checkpoint is not None and (stop or elapsed - last_checkpoint >= checkpoint_interval):
+                write_checkpoint(elapsed)
+                last_checkpoint = elapsed
+    finally:
+        if emit is not trace:
+            emit.close()  # opened here from a path, even if the search fails
+
+    # print(state.load)
     # print(I.capacity)
 
-    print(f"Final cost: {best_cost}")
-
-    return best_sol, best_cost, best_time, perf_counter() - start_time
\ No newline at end of file
+    if state.journal is not None:
+        best_sol = undo_moves(state.copy_routes(), state.journal)
+    if elite is not None:
+        elite.add([list(route) for route in best_sol], best_cost)
+
+    if stats is not None:
+        stats.iterations = iter
+        stats.elapsed = perf_counter() - search_start
+        stats.stop_reason = stop_reason
+
+    if verbose:
+        if stop_reason != "time limit":
+            print(f"Stopped: {stop_reason}")
+        print(f"Final cost: {best_cost}")
+
+    return best_sol, best_cost, best_time, perf_counter() - start_time
+
+def resume_local_search(path: str, I: CVRPInstance, start_time: Optional[float] = None, **kwargs):
+    """
+    Continues the local search saved in the checkpoint file `path` (see
+    local_search) with the remaining time budget, updating the same file as
+    it goes.
+
+    The time already spent is taken from the checkpoint unless `start_time`
+    is given. Keyword arguments are passed to local_search and override the
+    saved settings (e.g. a longer time_limit). The saved settings include
+    the stopping rules, whose counters (iterations, time since the last
+    improvement) continue from the checkpoint, and path relinking: the elite
+    pool is restored with its solutions unless `elite` is given. The search
+    state itself (routes, tabu memory, counters) is always restored, so the
+    search continues exactly as it would have without the interruption.
+
+    Returns the same values as local_search.
+    """
+    data = load_checkpoint(path)
+    if data["nnodes"] != I.nnodes or data["capacity"] != I.capacity:
+        raise ValueError(f"{path} was written for another instance "
+                         f"({data['nnodes']} nodes, capacity {data['capacity']}).")
+    if start_time is None:
+        start_time = perf_counter() - data["elapsed"]
+    settings = dict(data["settings"], checkpoint=path)
+    if data.get("elite") is not None:
+        settings["elite"] = ElitePool.from_dict(data["elite"])
+    settings.update(kwargs)
+    if settings.get("relink_after") is not None and settings.get("elite") is None:
+        settings["elite"] = ElitePool()
+    return local_search(data["routes"], I, start_time, resume=data, **settings)
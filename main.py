@@ -1,45 +1,124 @@
+import argparse
 import random
 import time
 from typing import List, Dict
-from sys import argv
 
 from utils import *
 from construction import *
-from local_search import local_search
+from local_search import EXPLORATIONS, EXTRA_OPERATORS, local_search, resume_local_search
+from instrumentation import SearchStats
+from stopping import stop_on_signals
+from elite import ElitePool
+from grasp import LEAN_SAVINGS_NEIGHBORS, construct
 
-instances_path = "vrp_instances/"
+parser = argparse.ArgumentParser(description="Runs a construction followed by the tabu local search.")
+parser.add_argument("instance", type=int, help="index in the instances list (0-7)")
+parser.add_argument("construction", help='"0" savings, "1" insertion, "3" sweep + split, anything else sweep')
+parser.add_argument("periodic_break", type=int)
+parser.add_argument("tau_reduction", type=int)
+parser.add_argument("--time-limit", type=float, help="seconds (default: 1800, or the checkpoint's with --resume)")
+parser.add_argument("--max-iterations", type=int, help="iteration budget")
+parser.add_argument("--stagnation-iterations", type=int,
+                    help="stop after this many iterations without improving the best cost")
+parser.add_argument("--stagnation-time", type=float,
+                    help="stop after this many seconds without improving the best cost")
+parser.add_argument("--target-cost", type=float, help="stop once the best cost is <= this value")
+parser.add_argument("--trace", help="convergence trace file (also prints per-operator statistics)")
+parser.add_argument("--checkpoint", help="file where the search state is saved periodically and on exit")
+parser.add_argument("--checkpoint-interval", type=float, help="seconds between checkpoints (default: 60)")
+parser.add_argument("--resume", action="store_true", help="continue the search saved in --checkpoint")
+parser.add_argument("--cache", action="store_true",
+                    help="keep a binary copy of the instance and its distance matrix next to the .vrp file")
+parser.add_argument("--backend", choices=BACKENDS, default="dense",
+                    help='"lean" computes distances on demand instead of storing the n x n matrix, '
+                         f'and limits the savings to the {LEAN_SAVINGS_NEIGHBORS} nearest neighbors')
+parser.add_argument("--evaluation", choices=("scalar", "batch"),
+                    help="evaluate neighborhoods move by move (default) or with NumPy; both select the same moves")
+parser.add_argument("--granular-k", type=int,
+                    help="granular neighborhoods: reinsertion and inter-swap only create arcs to the k nearest nodes")
+parser.add_argument("--granular-threshold", type=float,
+                    help="with --granular-k, candidate arcs are also at most this many times the average arc")
+parser.add_argument("--tabu-attributes", choices=("nodes", "arcs"),
+                    help="what moves make tabu: the nodes they move (default) or the arcs they remove")
+parser.add_argument("--extra-operators", nargs="+", choices=EXTRA_OPERATORS,
+                    help="inter-route neighborhoods added to the five default ones")
+parser.add_argument("--exploration", choices=EXPLORATIONS,
+                    help="best improvement (default), first improvement in random order, with don't-look bits, "
+                         "or don't-look bits with a best-improvement fallback (hybrid)")
+parser.add_argument("--seed", type=int, help="seed of the random order of --exploration first|dont-look|hybrid")
+parser.add_argument("--relink-after", type=int,
+                    help="path relinking with an elite solution after this many iterations without a new best")
+parser.add_argument("--elite-size", type=int, default=10, help="elite pool size with --relink-after (default: 10)")
+args = parser.parse_args()
+if args.resume and not args.checkpoint:
+    parser.error("--resume requires --checkpoint")
+if args.granular_threshold is not None and args.granular_k is None:
+    parser.error("--granular-threshold requires --granular-k")
 
-instances = [ "instance1.vrp" ,"instance2.vrp", "instance3.vrp",
-             "instance4.vrp", "instance5.vrp", "instance6.vrp",
-             "instance7.vrp", "instance8.vrp"]
-
-inst = int(argv[1])
+inst = args.instance
 filename = instances_path + instances[inst]
-construction = argv[2]
-periodic_break = int(argv[3])
-tau_reduction =  int(argv[4])
-time_limit = 60 * 30
+construction = args.construction
+periodic_break = args.periodic_break
+tau_reduction = args.tau_reduction
+trace_file = args.trace
+time_limit = args.time_limit if args.time_limit is not None else 60 * 30
 start_time = time.perf_counter()
 
-cvrp_instance: CVRPInstance = read_instance(filename)
+cvrp_instance: CVRPInstance = read_instance(filename, cache=args.cache, backend=args.backend)
 
-if construction == "0":
-    constructed_solution = savings_constructive_heuristic(cvrp_instance)
-elif construction == "1":
-    constructed_solution = insertion_constructive_heuristic(cvrp_instance, lam=1)
+if args.resume:
+    constructed_solution = None  # built by the checkpointed run
 else:
-    constructed_solution = sweep_constructive_heuristic(cvrp_instance)
+    constructed_solution = construct(cvrp_instance, construction)
 
-improved_solution, cost, time_best, total_time = local_search(constructed_solution, cvrp_instance, start_time, time_limit, periodic_break, tau_reduction)
+stats = SearchStats() if trace_file else None
+# SIGINT/SIGTERM stop the search early; the best solution so far is still reported and saved
+with stop_on_signals() as stop_event:
+    search_args = dict(stats=stats, trace=trace_file, stop_event=stop_event, checkpoint=args.checkpoint)
+    # Options left out keep their default, or the checkpoint's value with --resume
+    for option in ("max_iterations", "stagnation_iterations", "stagnation_time", "target_cost",
+                   "checkpoint_interval"):
+        if getattr(args, option) is not None:
+            search_args[option] = getattr(args, option)
+    if args.evaluation is not None:
+        search_args["evaluation"] = args.evaluation
+    if args.granular_k is not None:
+        search_args.update(granular_k=args.granular_k, granular_threshold=args.granular_threshold)
+    if args.tabu_attributes is not None:
+        search_args["tabu_attributes"] = args.tabu_attributes
+    if args.extra_operators is not None:
+        search_args["extra_operators"] = args.extra_operators
+    if args.exploration is not None:
+        search_args.update(exploration=args.exploration, seed=args.seed)
+    if args.relink_after is not None:
+        search_args["relink_after"] = args.relink_after
+        if not args.resume:
+            search_args["elite"] = ElitePool(args.elite_size)
+    if args.resume:
+        # Continues with the remaining time budget of the checkpointed run
+        if args.time_limit is not None:
+            search_args["time_limit"] = args.time_limit
+        improved_solution, cost, time_best, total_time = resume_local_search(args.checkpoint, cvrp_instance,
+                                                                             **search_args)
+    else:
+        improved_solution, cost, time_best, total_time = local_search(
+            constructed_solution, cvrp_instance, start_time, time_limit, periodic_break, tau_reduction,
+            **search_args)
 
 print(filename)
 print(construction)
 
-print("Initial solution:")
-print(constructed_solution)
+if constructed_solution is not None:
+    print("Initial solution:")
+    print(constructed_solution)
+else:
+    print(f"Resumed from {args.checkpoint}")
 print("Improved solution")
 print(improved_solution)
 
+if stats is not None:
+    print(stats.summary())
+
 with open(f"results/instance_{inst+1}_{construction}_{periodic_break}_{tau_reduction}.out", 'w') as file:
         # The .write() method writes the string to the file
         file.write(f"{inst+1};{construction};{total_time};{cost};{time_best}\n")
\ No newline at end of file
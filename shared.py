@@ -0,0 +1,109 @@
+from multiprocessing import shared_memory
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+from utils import CVRPInstance
+
+
+class SharedInstanceHandle(NamedTuple):
+    """
+    Picklable description of a published instance, passed to the workers.
+    """
+    name: str
+    nnodes: int
+    capacity: int
+    rounding: str
+    dtype: str
+    backend: str = "dense"
+
+
+def _layout(nnodes: int, dtype: np.dtype, backend: str = "dense") -> Tuple[int, int, int]:
+    """
+    Byte offsets of the demands and the distance matrix, and the total size.
+    The block holds coords (n x 2 float64) | demands (n int64) | distances (n x n),
+    without the distances for the lean backend.
+    """
+    demands_offset = nnodes * 2 * 8
+    matrix_offset = demands_offset + nnodes * 8
+    if backend == "lean":
+        return demands_offset, matrix_offset, matrix_offset
+    return demands_offset, matrix_offset, matrix_offset + nnodes * nnodes * dtype.itemsize
+
+
+def _views(buffer, nnodes: int, dtype: np.dtype, backend: str = "dense"):
+    demands_offset, matrix_offset, _ = _layout(nnodes, dtype)
+    coords = np.ndarray((nnodes, 2), dtype=np.float64, buffer=buffer)
+    demands = np.ndarray((nnodes,), dtype=np.int64, buffer=buffer, offset=demands_offset)
+    matrix = None
+    if backend != "lean":
+        matrix = np.ndarray((nnodes, nnodes), dtype=dtype, buffer=buffer, offset=matrix_offset)
+    return coords, demands, matrix
+
+
+class SharedInstance:
+    """
+    Publishes the coordinates, demands and distance matrix of an instance in a
+    single shared-memory block, so that worker processes can attach to it
+    (attach_instance) instead of reading the file and rebuilding the O(n²)
+    matrix each. Lean instances publish no matrix: each worker computes its
+    own rows on demand.
+
+    The publishing process owns the block: use it as a context manager, or
+    call close() and unlink() when the workers are done.
+    """
+
+    def __init__(self, instance: CVRPInstance):
+        n = instance.nnodes
+        dtype = instance.distance_matrix.dtype
+        backend = instance.backend
+        _, _, size = _layout(n, dtype, backend)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+
+        coords, demands, matrix = _views(self._shm.buf, n, dtype, backend)
+        coords[:] = np.asarray(instance.coords, dtype=np.float64).reshape(n, 2)
+        demands[:] = instance.demands
+        if matrix is not None:
+            matrix[:] = instance.distance_matrix
+
+        self.handle = SharedInstanceHandle(self._shm.name, n, instance.capacity,
+                                           instance.rounding, dtype.str, backend)
+
+    def close(self):
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
+
+    def __enter__(self) -> "SharedInstance":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        self.unlink()
+
+
+def attach_instance(handle: SharedInstanceHandle) -> CVRPInstance:
+    """
+    Builds a CVRPInstance over a published block. Coordinates and distance
+    matrix are read-only views of the shared memory (no copy); demands become
+    a plain list, since the scalar loops index them constantly.
+    """
+    try:
+        shm = shared_memory.SharedMemory(name=handle.name, track=False)
+    except TypeError:
+        # Python < 3.13 registers the block with the resource tracker. Worker
+        # processes started by multiprocessing share the publisher's tracker,
+        # so this is harmless there; unrelated processes would get their own
+        # tracker, which removes the block when they exit.
+        shm = shared_memory.SharedMemory(name=handle.name)
+
+    coords, demands, matrix = _views(shm.buf, handle.nnodes, np.dtype(handle.dtype), handle.backend)
+    coords.flags.writeable = False
+    if matrix is not None:
+        matrix.flags.writeable = False
+
+    instance = CVRPInstance(coords, demands.tolist(), handle.capacity, handle.rounding, distance_matrix=matrix,
+                            backend=handle.backend)
+    instance._shm = shm  # keeps the mapping alive as long as the instance
+    return instance
@@ -0,0 +1,270 @@
+from typing import List, Optional, Tuple
+
+from utils import CVRPInstance
+
+
+class SolutionState:
+    """
+    Routes of a CVRP solution plus the lookup arrays the local search needs.
+
+    Every route starts at the depot (route = [0, c1, c2, ...]) and implicitly
+    returns to it. For every customer v:
+        route_of[v]  index of the route holding v
+        position[v]  index of v inside that route
+        pred[v]      node visited before v (0 for the first customer)
+        succ[v]      node visited after v (0 for the last customer)
+    and for every route r:
+        load[r]            total demand
+        cost[r]            length of the closed tour
+        prefix_load[r][p]  demand of route[1..p]
+        prefix_dist[r][p]  distance travelled from the depot to route[p]
+
+    The move methods keep everything up to date, touching only the routes the
+    move changes. The depot entries of the node arrays are not meaningful.
+
+    When `journal` is a list, every move appends a record to it; undo_moves
+    replays the records backwards to recover the routes as they were when the
+    journal was started.
+    """
+
+    def __init__(self, routes: List[List[int]], instance: CVRPInstance):
+        self.instance = instance
+        self.routes: List[List[int]] = [list(route) for route in routes]
+        self.journal: Optional[List[Tuple]] = None
+
+        n = instance.nnodes
+        self.route_of: List[int] = [-1] * n
+        self.position: List[int] = [-1] * n
+        self.pred: List[int] = [-1] * n
+        self.succ: List[int] = [-1] * n
+
+        self.load: List[int] = []
+        self.cost: List[float] = []
+        self.prefix_load: List[List[int]] = []
+        self.prefix_dist: List[List[float]] = []
+        for r in range(len(self.routes)):
+            self._append_route_data()
+            self._refresh(r)
+
+    def _append_route_data(self):
+        self.load.append(0)
+        self.cost.append(0)
+        self.prefix_load.append([])
+        self.prefix_dist.append([])
+
+    def _refresh(self, r: int):
+        """
+        Recomputes the node arrays and the route data of route r in O(len(route)).
+        """
+        route = self.routes[r]
+        demands = self.instance.demands
+        D = self.instance.distance_rows
+        l_r = len(route)
+
+        prefix_load = [0] * l_r
+        prefix_dist = [0] * l_r
+        load = 0
+        dist = 0
+        for p in range(1, l_r):
+            v = route[p]
+            load += demands[v]
+            dist += D[route[p-1]][v]
+            prefix_load[p] = load
+            prefix_dist[p] = dist
+            self.route_of[v] = r
+            self.position[v] = p
+            self.pred[v] = route[p-1]
+            self.succ[v] = route[(p+1) % l_r]
+
+        self.load[r] = load
+        self.cost[r] = dist + D[route[-1]][route[0]]
+        self.prefix_load[r] = prefix_load
+        self.prefix_dist[r] = prefix_dist
+
+    def _delete_route(self, r: int):
+        del self.routes[r]
+        del self.load[r]
+        del self.cost[r]
+        del self.prefix_load[r]
+        del self.prefix_dist[r]
+        for route in self.routes[r:]:
+            for v in route[1:]:
+                self.route_of[v] -= 1
+
+    # ---- O(1) queries ----
+
+    def segment_load(self, r: int, i: int, j: int) -> int:
+        """
+        Demand of route[i..j] (1 <= i <= j).
+        """
+        prefix = self.prefix_load[r]
+        return prefix[j] - prefix[i-1]
+
+    def segment_dist(self, r: int, i: int, j: int):
+        """
+        Length of the path route[i] -> ... -> route[j] (i <= j).
+        """
+        prefix = self.prefix_dist[r]
+        return prefix[j] - prefix[i]
+
+    def total_cost(self):
+        return sum(self.cost)
+
+    def copy_routes(self) -> List[List[int]]:
+        return [list(route) for route in self.routes]
+
+    # ---- Moves ----
+
+    def relocate(self, r_1: int, i: int, r_2: int, j: int) -> bool:
+        """
+        Moves route r_1's customer at position i to position j of route r_2.
+        Returns True when route r_1 became empty and was deleted (routes after
+        it shift one index down).
+        """
+        v = self.routes[r_1].pop(i)
+        self.routes[r_2].insert(j, v)
+        self._refresh(r_1)
+        self._refresh(r_2)
+        deleted = len(self.routes[r_1]) == 1
+        if deleted:
+            self._delete_route(r_1)
+        if self.journal is not None:
+            self.journal.append(('relocate', r_1, i, r_2, j, deleted))
+        return deleted
+
+    def swap(self, r_1: int, i: int, r_2: int, j: int):
+        """
+        Exchanges route r_1's customer at position i with route r_2's customer
+        at position j (r_1 may equal r_2).
+        """
+        route_1 = self.routes[r_1]
+        route_2 = self.routes[r_2]
+        route_1[i], route_2[j] = route_2[j], route_1[i]
+        self._refresh(r_1)
+        if r_2 != r_1:
+            self._refresh(r_2)
+        if self.journal is not None:
+            self.journal.append(('swap', r_1, i, r_2, j))
+
+    def reverse(self, r: int, i: int, j: int):
+        """
+        Reverses route[i..j] in place (2-opt).
+        """
+        route = self.routes[r]
+        route[i:j+1] = route[i:j+1][::-1]
+        self._refresh(r)
+        if self.journal is not None:
+            self.journal.append(('reverse', r, i, j))
+
+    def swap_star(self, r_1: int, i: int, p: int, r_2: int, j: int, q: int):
+        """
+        SWAP*: route r_1's customer at position i goes to position q of route
+        r_2 and route r_2's customer at position j to position p of route
+        r_1 (r_1 != r_2). Positions refer to the routes before the move:
+        p == i puts the customer in place of the removed one, p > i + 1
+        inserts it before route_1[p].
+        """
+        route_1 = self.routes[r_1]
+        route_2 = self.routes[r_2]
+        u = route_1.pop(i)
+        v = route_2.pop(j)
+        route_1.insert(p if p <= i else p - 1, v)
+        route_2.insert(q if q <= j else q - 1, u)
+        self._refresh(r_1)
+        self._refresh(r_2)
+        if self.journal is not None:
+            self.journal.append(('swap*', r_1, i, p, r_2, j, q))
+
+    def exchange_tails(self, r_1: int, i: int, r_2: int, j: int) -> int:
+        """
+        2-opt*: route r_1 continues after position i with route r_2's tail
+        after position j, and the other way round. Returns the index of the
+        route that became empty and was deleted, or -1.
+        """
+        route_1 = self.routes[r_1]
+        route_2 = self.routes[r_2]
+        route_1[i+1:], route_2[j+1:] = route_2[j+1:], route_1[i+1:]
+        self._refresh(r_1)
+        self._refresh(r_2)
+        deleted = r_1 if len(route_1) == 1 else r_2 if len(route_2) == 1 else -1
+        if deleted >= 0:
+            self._delete_route(deleted)
+        if self.journal is not None:
+            self.journal.append(('tails', r_1, i, r_2, j, deleted))
+        return deleted
+
+    def move_segment(self, r_1: int, i: int, k: int, r_2: int, j: int, reverse: bool) -> bool:
+        """
+        Or-opt: moves route r_1's customers at positions i .. i+k-1 to
+        position j of route r_2 (r_1 != r_2), reversed if `reverse`.
+        Returns True when route r_1 became empty and was deleted.
+        """
+        route_1 = self.routes[r_1]
+        segment = route_1[i:i+k]
+        del route_1[i:i+k]
+        self.routes[r_2][j:j] = segment[::-1] if reverse else segment
+        self._refresh(r_1)
+        self._refresh(r_2)
+        deleted = len(route_1) == 1
+        if deleted:
+            self._delete_route(r_1)
+        if self.journal is not None:
+            self.journal.append(('segment', r_1, i, k, r_2, j, reverse, deleted))
+        return deleted
+
+    def split(self, r: int, i: int):
+        """
+        Moves route[i:] to a new route appended at the end (break-route).
+        """
+        route = self.routes[r]
+        self.routes.append([route[0]] + route[i:])
+        del route[i:]
+        self._append_route_data()
+        self._refresh(r)
+        self._refresh(len(self.routes) - 1)
+        if self.journal is not None:
+            self.journal.append(('split', r, i))
+
+
+def undo_moves(routes: List[List[int]], journal: List[Tuple]) -> List[List[int]]:
+    """
+    Undoes the journaled moves on `routes` (in place, newest first) and
+    returns them.
+    """
+    for record in reversed(journal):
+        move = record[0]
+        if move == 'relocate':
+            _, r_1, i, r_2, j, deleted = record
+            if deleted:
+                routes.insert(r_1, [0])
+            routes[r_1].insert(i, routes[r_2].pop(j))
+        elif move == 'swap':
+            _, r_1, i, r_2, j = record
+            routes[r_1][i], routes[r_2][j] = routes[r_2][j], routes[r_1][i]
+        elif move == 'reverse':
+            _, r, i, j = record
+            routes[r][i:j+1] = routes[r][i:j+1][::-1]
+        elif move == 'swap*':
+            _, r_1, i, p, r_2, j, q = record
+            v = routes[r_1].pop(p if p <= i else p - 1)
+            u = routes[r_2].pop(q if q <= j else q - 1)
+            routes[r_1].insert(i, u)
+            routes[r_2].insert(j, v)
+        elif move == 'tails':
+            _, r_1, i, r_2, j, deleted = record
+            if deleted >= 0:
+                routes.insert(deleted, [0])
+            route_1 = routes[r_1]
+            route_2 = routes[r_2]
+            route_1[i+1:], route_2[j+1:] = route_2[j+1:], route_1[i+1:]
+        elif move == 'segment':
+            _, r_1, i, k, r_2, j, reverse, deleted = record
+            if deleted:
+                routes.insert(r_1, [0])
+            segment = routes[r_2][j:j+k]
+            del routes[r_2][j:j+k]
+            routes[r_1][i:i] = segment[::-1] if reverse else segment
+        elif move == 'split':
+            _, r, i = record
+            routes[r].extend(routes.pop()[1:])
+    return routes
@@ -0,0 +1,141 @@
+import asyncio
+import queue
+import random
+import threading
+from time import perf_counter
+from typing import AsyncIterator, Callable, Iterator, List, NamedTuple, Optional
+
+from utils import CVRPInstance
+from grasp import construct
+from local_search import local_search
+from solution import SolutionState
+
+
+class Solution(NamedTuple):
+    """
+    A solution reported by solve(): `elapsed` is the number of seconds since
+    solve() was called and `iteration` the local search iteration that found
+    it (0 for the construction).
+    """
+    routes: List[List[int]]
+    cost: float
+    elapsed: float
+    iteration: int
+
+
+class _SearchThread:
+    """
+    Runs local_search in a background thread, handing every new best
+    solution to `publish`, then None once the search is over. The search
+    stops early when `stop()` is called.
+    """
+
+    def __init__(self, instance: CVRPInstance, routes: List[List[int]], start: float, time_limit: float,
+                 periodic_break: int, tau_reduction: int, publish: Callable[[Optional[Solution]], None],
+                 search_args: dict):
+        self.stop_event = threading.Event()
+        self.error: Optional[BaseException] = None
+
+        def improved(routes, cost, elapsed, iteration):
+            publish(Solution(routes, cost, elapsed, iteration))
+
+        def run():
+            try:
+                local_search(routes, instance, start, time_limit, periodic_break, tau_reduction,
+                             verbose=False, stop_event=self.stop_event, on_improvement=improved, **search_args)
+            except BaseException as error:
+                self.error = error
+            finally:
+                publish(None)
+
+        self.thread = threading.Thread(target=run, name="local-search", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+
+def _initial(instance: CVRPInstance, construction: str, rcl_alpha: float, seed: Optional[int],
+             start: float) -> Solution:
+    rng = random.Random(seed) if rcl_alpha > 0 else None
+    routes = construct(instance, construction, rcl_alpha, rng)
+    return Solution(routes, SolutionState(routes, instance).total_cost(), perf_counter() - start, 0)
+
+
+def solve(instance: CVRPInstance, construction: str = "0", time_limit: float = 60 * 30,
+          periodic_break: int = 0, tau_reduction: int = 0, rcl_alpha: float = 0.0,
+          seed: Optional[int] = None, **search_args) -> Iterator[Solution]:
+    """
+    Anytime solver: a generator of improving solutions.
+
+    The first item is the output of the construction (ids as in main.py,
+    randomized with rcl_alpha > 0 and `seed`); then the local search runs in
+    a background thread and every new best solution is yielded as soon as it
+    is found, with its cost, time and iteration. The generator ends when the
+    search stops (time_limit, or any rule of local_search given in
+    `search_args`, e.g. max_iterations or target_cost).
+
+    Breaking out of the loop or calling close() cancels the search: it stops
+    after the current iteration. Improvements are queued, so a slow consumer
+    still sees all of them in order; the last one is the best.
+
+        for solution in solve(instance, time_limit=60):
+            publish(solution.routes, solution.cost)
+            if good_enough(solution):
+                break
+    """
+    start = perf_counter()
+    initial = _initial(instance, construction, rcl_alpha, seed, start)
+    yield initial
+
+    found: "queue.Queue[Optional[Solution]]" = queue.Queue()
+    search = _SearchThread(instance, initial.routes, start, time_limit, periodic_break, tau_reduction,
+                           found.put, search_args)
+    try:
+        while True:
+            solution = found.get()
+            if solution is None:
+                break
+            yield solution
+        search.check()
+    finally:
+        search.stop()
+
+
+async def solve_async(instance: CVRPInstance, construction: str = "0", time_limit: float = 60 * 30,
+                      periodic_break: int = 0, tau_reduction: int = 0, rcl_alpha: float = 0.0,
+                      seed: Optional[int] = None, **search_args) -> AsyncIterator[Solution]:
+    """
+    solve() as an async iterator, for use from an event loop:
+
+        async for solution in solve_async(instance, time_limit=60):
+            ...
+
+    The construction runs in the default executor and the local search in a
+    background thread, so the event loop is never blocked for long.
+    Cancelling the consuming task, or leaving the loop, stops the search
+    after its current iteration.
+    """
+    loop = asyncio.get_running_loop()
+    start = perf_counter()
+    initial = await loop.run_in_executor(None, _initial, instance, construction, rcl_alpha, seed, start)
+    yield initial
+
+    found: "asyncio.Queue[Optional[Solution]]" = asyncio.Queue()
+    search = _SearchThread(instance, initial.routes, start, time_limit, periodic_break, tau_reduction,
+                           lambda solution: loop.call_soon_threadsafe(found.put_nowait, solution), search_args)
+    try:
+        while True:
+            solution = await found.get()
+            if solution is None:
+                break
+            yield solution
+        search.check()
+    finally:
+        search.stop_event.set()
+        await loop.run_in_executor(None, search.thread.join)
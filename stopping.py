@@ -0,0 +1,32 @@
+import signal
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Sequence
+
+STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+
+@contextmanager
+def stop_on_signals(signals: Sequence[int] = STOP_SIGNALS) -> Iterator[threading.Event]:
+    """
+    Turns SIGINT/SIGTERM into a stop request while the block runs.
+
+    Yields an event that is set when one of `signals` arrives; pass it as
+    local_search(stop_event=...) so the search stops after the current
+    iteration and returns the best solution found so far. A second signal
+    while the event is set raises KeyboardInterrupt as usual. The previous
+    handlers are restored on exit. Must be used from the main thread.
+    """
+    event = threading.Event()
+
+    def handler(signum, frame):
+        if event.is_set():
+            raise KeyboardInterrupt
+        event.set()
+
+    previous = {s: signal.signal(s, handler) for s in signals}
+    try:
+        yield event
+    finally:
+        for s, h in previous.items():
+            signal.signal(s, h)
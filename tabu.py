@@ -0,0 +1,122 @@
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+Arc = Tuple[int, int]
+
+
+def arc(a: int, b: int) -> Arc:
+    """
+    Undirected arc key of the tabu memory in "arcs" mode.
+    """
+    return (a, b) if a < b else (b, a)
+
+
+class TabuMemory:
+    """
+    Recency-based tabu memory with O(1) queries.
+
+    Tabu attributes (nodes, or arcs) are stamped with the slot of the move
+    that made them tabu: every move fills two slots, as the two entries the
+    list-based tabu list appended per iteration. An attribute is tabu while
+    its stamp is at least `start`, i.e. while it is within the last `length`
+    slots (the tenure, 2 slots per iteration) and was not cleared. The
+    tenure changes of the search are changes of that window:
+        shrink(k)     forget the k oldest slots and keep the shorter tenure
+        grow(length)  longer tenure, from now on: attributes that already
+                      expired stay expired
+        clear()       nothing is tabu any more, tenure back to `length`
+    which behave exactly like slicing and padding the former list.
+
+    `changes()` returns the attributes whose tabu status changed since the
+    previous call, so that the move cache and the tabu flags can be updated
+    incrementally.
+    """
+
+    def __init__(self, length: int):
+        self.length = length
+        self.next = 0                                  # stamp of the next slot
+        self.front = -length                           # first slot of the window
+        self.start = 0                                 # lowest stamp still tabu
+        self.stamp: Dict[Hashable, int] = {}
+        self._slots: Dict[int, List[Hashable]] = {}    # stamp -> attributes
+        self._active: Set[Hashable] = set()            # tabu at the last changes()
+        self._touched: Set[Hashable] = set()
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __contains__(self, attribute: Hashable) -> bool:
+        return self.stamp.get(attribute, -1) >= self.start
+
+    def push(self, *slots: Iterable[Hashable]):
+        """
+        Records a move: each argument fills one slot with the attributes it
+        makes tabu (possibly none), and the oldest slots leave the window.
+        """
+        for attributes in slots:
+            attributes = list(attributes)
+            for attribute in attributes:
+                self.stamp[attribute] = self.next
+            self._slots[self.next] = attributes
+            self._touched.update(attributes)
+            self.next += 1
+        self.front += len(slots)
+        self._expire(self.front)
+
+    def shrink(self, k: int):
+        self.front += k
+        self.length -= k
+        self._expire(self.front)
+
+    def grow(self, length: int):
+        self.front = self.next - length
+        self.length = length
+
+    def clear(self, length: int):
+        self.grow(length)
+        self._expire(self.next)
+
+    def _expire(self, start: int):
+        for stamp in range(self.start, max(self.start, start)):
+            self._touched.update(self._slots.pop(stamp, ()))
+        self.start = max(self.start, start)
+
+    def changes(self) -> Set[Hashable]:
+        changed = set()
+        for attribute in self._touched:
+            if (attribute in self) != (attribute in self._active):
+                changed.add(attribute)
+            if attribute not in self:
+                self.stamp.pop(attribute, None)
+        self._active ^= changed
+        self._touched = set()
+        return changed
+
+    # ---- Checkpoints ----
+
+    def to_dict(self) -> Dict:
+        return {
+            "length": self.length,
+            "next": self.next,
+            "front": self.front,
+            "start": self.start,
+            "slots": [[stamp, attributes] for stamp, attributes in sorted(self._slots.items())],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TabuMemory":
+        """
+        Restores a memory saved with to_dict(). Every tabu attribute is
+        reported by the first changes().
+        """
+        memory = cls(data["length"])
+        memory.next = data["next"]
+        memory.front = data["front"]
+        memory.start = data["start"]
+        for stamp, attributes in data["slots"]:
+            # JSON turns arcs into lists
+            attributes = [tuple(a) if isinstance(a, list) else a for a in attributes]
+            memory._slots[stamp] = attributes
+            for attribute in attributes:
+                memory.stamp[attribute] = stamp
+            memory._touched.update(attributes)
+        return memory
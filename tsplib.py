@@ -0,0 +1,237 @@
+import json
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Rounding rule used for each supported EDGE_WEIGHT_TYPE when read_instance
+# is asked to follow the file (rounding=None). EXPLICIT instances carry their
+# own distances.
+EDGE_WEIGHT_ROUNDING = {
+    "EUC_2D": "nint",
+    "CEIL_2D": "ceil",
+    "FLOOR_2D": "floor",
+    "EXACT_2D": "exact",
+}
+
+# Order in which EDGE_WEIGHT_SECTION lists the entries, as (i, j) index
+# arrays. The *_COL formats of a symmetric matrix list the same numbers as
+# the *_ROW format of the opposite triangle.
+_TRIANGLES = {
+    "UPPER_ROW": lambda n: np.triu_indices(n, 1),
+    "LOWER_ROW": lambda n: np.tril_indices(n, -1),
+    "UPPER_DIAG_ROW": lambda n: np.triu_indices(n),
+    "LOWER_DIAG_ROW": lambda n: np.tril_indices(n),
+    "UPPER_COL": lambda n: np.tril_indices(n, -1),
+    "LOWER_COL": lambda n: np.triu_indices(n, 1),
+    "UPPER_DIAG_COL": lambda n: np.tril_indices(n),
+    "LOWER_DIAG_COL": lambda n: np.triu_indices(n),
+}
+
+_SECTION = re.compile(r'^[ \t]*([A-Z_]+_SECTION|EOF)\b.*$', re.MULTILINE)
+
+
+class TSPLIBInstance(NamedTuple):
+    """
+    Contents of a TSPLIB CVRP file, with the nodes renumbered so that the
+    depot is node 0. `coords` is None for EXPLICIT instances without
+    DISPLAY_DATA_SECTION; `distance_matrix` is only set for EXPLICIT ones.
+    """
+    name: str
+    edge_weight_type: str
+    capacity: int
+    coords: Optional[np.ndarray]        # n x 2 float64
+    demands: np.ndarray                 # n int64
+    distance_matrix: Optional[np.ndarray]
+
+
+def _numbers(text: str, count: int, section: str, filename: str) -> np.ndarray:
+    values = np.array(text.split(), dtype=np.float64)
+    if len(values) < count:
+        raise ValueError(f"{filename}: {section} has {len(values)} numbers, expected {count}.")
+    return values[:count]
+
+
+def _explicit_matrix(values: np.ndarray, n: int, fmt: str, filename: str) -> np.ndarray:
+    if fmt == "FULL_MATRIX":
+        matrix = values.reshape(n, n)
+    elif fmt in _TRIANGLES:
+        rows, cols = _TRIANGLES[fmt](n)
+        matrix = np.zeros((n, n), dtype=np.float64)
+        matrix[rows, cols] = values
+        matrix[cols, rows] = values
+    else:
+        raise ValueError(f"{filename}: unsupported EDGE_WEIGHT_FORMAT '{fmt}'.")
+    # Same storage as the computed matrices: int32 unless weights are fractional
+    if np.all(matrix == np.floor(matrix)):
+        return matrix.astype(np.int32)
+    return matrix.astype(np.float32)
+
+
+def _explicit_size(n: int, fmt: str) -> int:
+    if fmt == "FULL_MATRIX":
+        return n * n
+    if fmt in ("UPPER_ROW", "LOWER_ROW", "UPPER_COL", "LOWER_COL"):
+        return n * (n - 1) // 2
+    return n * (n + 1) // 2
+
+
+def parse_tsplib(filename: str) -> TSPLIBInstance:
+    """
+    Reads a TSPLIB CVRP file in one pass over its text: the header fields
+    (NAME, DIMENSION, CAPACITY, EDGE_WEIGHT_TYPE, EDGE_WEIGHT_FORMAT) and the
+    NODE_COORD, DEMAND, DEPOT, EDGE_WEIGHT and DISPLAY_DATA sections, each
+    converted to an array in a single call.
+
+    Raises ValueError for missing mandatory fields, short sections,
+    unsupported edge weight types or several depots.
+    """
+    with open(filename) as f:
+        text = f.read()
+
+    matches = list(_SECTION.finditer(text))
+    header: Dict[str, str] = {}
+    for line in text[:matches[0].start() if matches else len(text)].splitlines():
+        if ':' in line:
+            key, value = line.split(':', 1)
+            header[key.strip().upper()] = value.strip()
+
+    sections: Dict[str, str] = {}
+    for k, match in enumerate(matches):
+        end = matches[k + 1].start() if k + 1 < len(matches) else len(text)
+        sections[match.group(1)] = text[match.end():end]
+
+    if "CAPACITY" not in header:
+        raise ValueError("Instance file missing CAPACITY.")
+    if "DEMAND_SECTION" not in sections:
+        raise ValueError(f"{filename}: missing DEMAND_SECTION.")
+    capacity = int(float(header["CAPACITY"]))
+    edge_weight_type = header.get("EDGE_WEIGHT_TYPE", "EUC_2D").upper()
+
+    if "DIMENSION" in header:
+        n = int(header["DIMENSION"])
+    else:
+        n = len(sections["DEMAND_SECTION"].split()) // 2
+
+    # Node ids in the sections are 1-based and listed in order
+    demands = _numbers(sections["DEMAND_SECTION"], 2 * n, "DEMAND_SECTION", filename)
+    demands = demands.reshape(n, 2)[:, 1].astype(np.int64)
+
+    coords = None
+    coord_section = "NODE_COORD_SECTION" if "NODE_COORD_SECTION" in sections else "DISPLAY_DATA_SECTION"
+    if coord_section in sections:
+        coords = _numbers(sections[coord_section], 3 * n, coord_section, filename).reshape(n, 3)[:, 1:].copy()
+
+    distance_matrix = None
+    if edge_weight_type == "EXPLICIT":
+        fmt = header.get("EDGE_WEIGHT_FORMAT", "FULL_MATRIX").upper()
+        if "EDGE_WEIGHT_SECTION" not in sections:
+            raise ValueError(f"{filename}: EXPLICIT instance without EDGE_WEIGHT_SECTION.")
+        values = _numbers(sections["EDGE_WEIGHT_SECTION"], _explicit_size(n, fmt), "EDGE_WEIGHT_SECTION", filename)
+        distance_matrix = _explicit_matrix(values, n, fmt, filename)
+    elif edge_weight_type not in EDGE_WEIGHT_ROUNDING:
+        raise ValueError(f"{filename}: unsupported EDGE_WEIGHT_TYPE '{edge_weight_type}'.")
+    elif coords is None:
+        raise ValueError(f"{filename}: missing NODE_COORD_SECTION.")
+
+    depot = 0
+    if "DEPOT_SECTION" in sections:
+        depots = [int(float(v)) for v in sections["DEPOT_SECTION"].split()]
+        depots = depots[:depots.index(-1)] if -1 in depots else depots
+        if len(depots) > 1:
+            raise ValueError(f"{filename}: {len(depots)} depots, only one is supported.")
+        if depots:
+            depot = depots[0] - 1
+
+    if depot != 0:
+        # The solver assumes the depot is node 0
+        order = np.array([depot] + [v for v in range(n) if v != depot])
+        demands = demands[order]
+        if coords is not None:
+            coords = coords[order]
+        if distance_matrix is not None:
+            distance_matrix = distance_matrix[np.ix_(order, order)]
+
+    return TSPLIBInstance(header.get("NAME", os.path.basename(filename)), edge_weight_type,
+                          capacity, coords, demands, distance_matrix)
+
+
+# ---- Binary cache ----
+#
+# <file>.vrp.<key>.cache holds a JSON header (padded to a multiple of 64
+# bytes, after the magic and its length) followed by
+#     coords (n x 2 float64) | demands (n int64) | distances (n x n)
+# `key` is the requested rounding rule; the header records the rule actually
+# applied, and the size and modification time of the .vrp file, so a cache
+# is rebuilt when the instance changes.
+CACHE_MAGIC = b"CVRPCACHE1\n"
+_ALIGN = 64
+
+
+def cache_path(filename: str, key: str) -> str:
+    return f"{filename}.{key}.cache"
+
+
+def _source_stamp(filename: str) -> List[int]:
+    stat = os.stat(filename)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def write_cache(filename: str, key: str, coords: np.ndarray, demands: np.ndarray, capacity: int,
+                rounding: str, distance_matrix: np.ndarray):
+    """
+    Writes the binary cache of `filename` (atomically). Failures to write,
+    e.g. on a read-only instance folder, are ignored: the cache is optional.
+    """
+    n = len(demands)
+    header = json.dumps({"nnodes": n, "capacity": int(capacity), "rounding": rounding,
+                         "dtype": distance_matrix.dtype.str, "source": _source_stamp(filename)}).encode()
+    prefix = len(CACHE_MAGIC) + 8
+    header += b" " * (-(prefix + len(header)) % _ALIGN)
+    path = cache_path(filename, key)
+    tmp = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp, 'wb') as file:
+            file.write(CACHE_MAGIC)
+            file.write(len(header).to_bytes(8, 'little'))
+            file.write(header)
+            file.write(np.ascontiguousarray(coords, dtype=np.float64).tobytes())
+            file.write(np.ascontiguousarray(demands, dtype=np.int64).tobytes())
+            file.write(np.ascontiguousarray(distance_matrix).tobytes())
+        os.replace(tmp, path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def load_cache(filename: str, key: str) -> Optional[Tuple[np.ndarray, np.ndarray, int, str, np.ndarray]]:
+    """
+    Memory-maps the cache of `filename`. Returns (coords, demands, capacity,
+    rounding, distance_matrix), the arrays being read-only views of the file,
+    or None when there is no up-to-date cache.
+    """
+    path = cache_path(filename, key)
+    try:
+        with open(path, 'rb') as file:
+            if file.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                return None
+            length = int.from_bytes(file.read(8), 'little')
+            header = json.loads(file.read(length))
+        if header["source"] != _source_stamp(filename):
+            return None
+    except (OSError, ValueError, KeyError):
+        return None
+
+    n = header["nnodes"]
+    dtype = np.dtype(header["dtype"])
+    start = len(CACHE_MAGIC) + 8 + length
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    if len(mapped) != start + n * 16 + n * 8 + n * n * dtype.itemsize:
+        return None
+    coords = mapped[start:start + n * 16].view(np.float64).reshape(n, 2)
+    start += n * 16
+    demands = mapped[start:start + n * 8].view(np.int64)
+    start += n * 8
+    distance_matrix = mapped[start:].view(dtype).reshape(n, n)
+    return coords, demands, header["capacity"], header["rounding"], distance_matrix
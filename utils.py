@@ -1,72 +1,142 @@
-from typing import List, Tuple, Optional
-from math import sqrt, floor
+from typing import Dict, List, Tuple, Optional
+
+import numpy as np
+
+from distances import ROW_CACHE_SIZE, LazyDistanceMatrix, compute_distance_matrix, matrix_rows, nearest_neighbors
+from tsplib import EDGE_WEIGHT_ROUNDING, load_cache, parse_tsplib, write_cache
 
 # Type alias for clarity
 Coordinates = List[Tuple[float, float]]
 
+# Bundled instances, indexed by the <instance_index> argument of the scripts
+instances_path = "vrp_instances/"
+
+instances = [ "instance1.vrp" ,"instance2.vrp", "instance3.vrp",
+             "instance4.vrp", "instance5.vrp", "instance6.vrp",
+             "instance7.vrp", "instance8.vrp"]
+
+# Distance backends of CVRPInstance
+BACKENDS = ("dense", "lean")
+
 class CVRPInstance:
-    def __init__(self, coords: Coordinates, demands: List[int], capacity: int):
+    def __init__(self, coords: Coordinates, demands: List[int], capacity: int,
+                 rounding: str = "floor", distance_matrix: Optional[np.ndarray] = None,
+                 backend: str = "dense", row_cache: int = ROW_CACHE_SIZE):
+        """
+        `distance_matrix` may be given when it is already available (e.g. a
+        view of shared memory, see shared.py); it is used as is, not copied.
+
+        `backend` selects how distances are stored:
+            "dense"  n x n matrix (the default, fastest)
+            "lean"   coordinates only; distances are computed on demand and
+                     the last `row_cache` rows are kept (see
+                     distances.LazyDistanceMatrix). Memory is O(n) plus the
+                     cache and the neighbor lists, for instances too large
+                     for a dense matrix.
+        Both backends give the same distances, so the heuristics find the
+        same solutions.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}.")
         self.nnodes: int = len(coords)
         self.coords: Coordinates = coords
         self.demands: List[int] = demands
         self.capacity: int = capacity
         self.depot: int = 0  # first node is the depot
         self.nodes: List[int] = list(range(self.nnodes))
-        self.distance_matrix: List[List[float]] = self._compute_distance_matrix()
+        self.rounding: str = rounding
+        self.backend: str = backend
+        if backend == "lean":
+            distance_matrix = LazyDistanceMatrix(coords, rounding, row_cache)
+        elif distance_matrix is None:
+            distance_matrix = self._compute_distance_matrix()
+        self.distance_matrix: np.ndarray = distance_matrix
+        # Row views used by the scalar loops: distance_rows[i][j] -> int/float
+        if backend == "lean":
+            self.distance_rows = self.distance_matrix.rows
+        else:
+            self.distance_rows: List[memoryview] = matrix_rows(self.distance_matrix)
+        self._neighbors: Dict[int, np.ndarray] = {}
+
+    def _compute_distance_matrix(self) -> np.ndarray:
+        """
+        Compute Euclidean distance matrix between nodes (see distances.py).
+        """
+        return compute_distance_matrix(self.coords, self.rounding)
+
+    def dist(self, i: int, j: int):
+        """
+        Distance between nodes i and j as a plain Python number.
+        """
+        return self.distance_rows[i][j]
+
+    def row(self, i: int) -> np.ndarray:
+        """
+        Distances from node i to every node, as a view into distance_matrix
+        (a cached row with the lean backend).
+        """
+        return self.distance_matrix[i]
 
-    def _compute_distance_matrix(self) -> List[List[int]]:
+    def nearest_neighbors(self, k: int) -> np.ndarray:
         """
-        Compute Euclidean distance matrix between nodes.
+        n x k matrix with the k nearest nodes of each node, closest first.
+        Computed once per k.
         """
-        n = self.nnodes
-        dist = [[0.0] * n for _ in range(n)]
-        for i in range(n):
-            xi, yi = self.coords[i]
-            for j in range(n):
-                xj, yj = self.coords[j]
-                dist[i][j] = floor(sqrt((xi - xj)**2 + (yi - yj)**2))
-        return dist
+        if k not in self._neighbors:
+            self._neighbors[k] = nearest_neighbors(self.distance_matrix, k)
+        return self._neighbors[k]
 
     def __str__(self) -> str:
         return (f"CVRPInstance(num_nodes={self.nnodes}, "
                 f"capacity={self.capacity}, depot={self.depot})")
 
-def read_instance(filename: str) -> CVRPInstance:
+def read_instance(filename: str, rounding: Optional[str] = "floor", cache: bool = False,
+                  backend: str = "dense") -> CVRPInstance:
     """
-    Reads a CVRP instance file and returns coordinates, demands, and vehicle capacity.
-    Assumes a single depot at the first node.
+    Reads a TSPLIB CVRP instance file (see tsplib.parse_tsplib). The depot
+    given in DEPOT_SECTION becomes node 0.
+
+    `rounding` selects the distance rounding rule (see distances.ROUNDING_RULES);
+    None follows the file's EDGE_WEIGHT_TYPE (EUC_2D -> "nint", CEIL_2D ->
+    "ceil"). EXPLICIT instances use the distances of the file (rounding
+    "explicit"); without DISPLAY_DATA_SECTION their coordinates are all 0.
+
+    With `cache`, the parsed instance and its distance matrix are stored in
+    a binary file next to `filename` and later calls memory-map it instead
+    of parsing the file and building the matrix again.
+
+    `backend` is passed to CVRPInstance. The lean backend never builds the
+    matrix, so it ignores `cache`, and it needs coordinates: EXPLICIT
+    instances raise ValueError.
     """
-    coords: Coordinates = []
-    demands: List[int] = []
-    capacity: Optional[int] = None
-
-    with open(filename) as f:
-        mode: Optional[str] = None
-        for line in f:
-            line = line.strip()
-            if line.startswith('CAPACITY'):
-                capacity = int(line.split(':')[1])
-            elif line.startswith('NODE_COORD_SECTION'):
-                mode = 'coords'
-                continue
-            elif line.startswith('DEMAND_SECTION'):
-                mode = 'demands'
-                continue
-            elif line.startswith('DEPOT_SECTION'):
-                break  # We assume first node is depot
-            if mode == 'coords':
-                parts = line.split()
-                x, y = float(parts[1]), float(parts[2])
-                coords.append((x, y))
-            elif mode == 'demands':
-                parts = line.split()
-                d = int(parts[1])
-                demands.append(d)
-
-    if capacity is None:
-        raise ValueError("Instance file missing CAPACITY.")
-    
-    return CVRPInstance(coords, demands, capacity)
+    key = rounding or "tsplib"
+    if backend == "lean":
+        cache = False
+    if cache:
+        cached = load_cache(filename, key)
+        if cached is not None:
+            coords, demands, capacity, rounding, distance_matrix = cached
+            return CVRPInstance(list(map(tuple, coords.tolist())), demands.tolist(), capacity, rounding,
+                                distance_matrix)
+
+    data = parse_tsplib(filename)
+    n = len(data.demands)
+    coords = data.coords if data.coords is not None else np.zeros((n, 2))
+    distance_matrix = data.distance_matrix
+    if distance_matrix is not None:
+        if backend == "lean":
+            raise ValueError(f"{filename}: the lean backend needs coordinates, not EXPLICIT distances.")
+        rounding = "explicit"
+    else:
+        rounding = rounding or EDGE_WEIGHT_ROUNDING[data.edge_weight_type]
+        if backend == "dense":
+            distance_matrix = compute_distance_matrix(coords, rounding)
+
+    if cache:
+        write_cache(filename, key, coords, data.demands, data.capacity, rounding, distance_matrix)
+
+    return CVRPInstance(list(map(tuple, coords.tolist())), data.demands.tolist(), data.capacity, rounding,
+                        distance_matrix, backend)
 
 # Checks whether the tour respects vehicle capacity
 def check_route_feasibility(route: List[int], cvrp_instance: CVRPInstance) -> bool: